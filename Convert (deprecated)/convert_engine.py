@@ -0,0 +1,208 @@
+# Converts many videos at once, with a pool of worker processes.
+#
+# The work is split in two:
+# * The coordinator (the process that calls `run`) is the only one that touches 'namespace.json'
+#   or moves files between directories, so those changes are always made one at a time, in order.
+#   Renaming happens up front, before any conversion starts.
+# * Each worker converts one video at a time into its subdirectory of cropped eye images, within
+#   the directory the video is in. Frames are decoded straight into memory, so only the cropped
+#   images are written. The face is detected periodically and tracked in between (see
+#   `convert_helper.track_faces`). The landmarks found for each video are cached, so converting it
+#   again (e.g. with a different output size) doesn't need dlib at all. Each worker loads dlib's
+#   models once, the first time it needs them.
+#
+# Instead of holding off interrupts until each video is done, every step can be safely picked up
+# again if we're stopped partway through:
+# * renames are written to the progress file before they're made (see
+#   `convert_helper.rename_with_namespace`), and are finished on the next run.
+# * a video is only done once its output is in 'Data/' and it's been recorded in the manifest (see
+#   'manifest.py'). Anything else left over from a video that was being converted is removed, and
+#   it's converted again.
+# So, the script can be stopped at any time and started again later.
+#
+# The manifest also means that videos are only converted when they need to be: a video is skipped
+# if it was already converted from the same file, with the same parameters.
+
+import os
+import sys
+import json
+import shutil
+import signal
+import itertools
+import multiprocessing
+
+import numpy as np
+
+import convert_helper as helper
+from manifest import Manifest
+
+# import `consts.py` from the parent directory
+from os.path import abspath, join, dirname
+sys.path.append(abspath(join(dirname(abspath(__file__)), '..')))
+import consts
+
+def init_worker():
+	# interrupts are handled by the coordinator, which stops the workers itself
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def subdir_for(filename):
+	return helper.parse_import_filename(filename)[0]
+
+# converts the video with the given filename in `data_dir` into a subdirectory of cropped images
+# next to it. Runs in a worker process.
+#
+# `video_hash` is the hash of the video, as given by `convert_helper.file_hash`
+#
+# returns a tuple of the filename, its hash, and the number of frames, which is None if the video
+# couldn't be used
+def convert_video(filename, data_dir, video_hash):
+	subdir_name = subdir_for(filename)
+	subdir_path = join(data_dir, subdir_name)
+
+	# this would be left over from an interrupted run, so we start again
+	if os.path.exists(subdir_path):
+		shutil.rmtree(subdir_path)
+	os.makedirs(subdir_path)
+
+	video_path = join(data_dir, filename)
+
+	# if we've already found the landmarks for this video, we only need to crop it again
+	landmarks = helper.load_landmarks(video_hash)
+	if landmarks is not None and len(landmarks) == 0:
+		shutil.rmtree(subdir_path)
+		return filename, video_hash, None
+
+	frames = helper.read_frames(video_path)
+
+	if landmarks is not None:
+		with helper.EyeWriter(subdir_path) as writer:
+			for start in range(0, len(landmarks), consts.crop_batch_size):
+				batch = list(itertools.islice(frames, consts.crop_batch_size))
+				if len(batch) == 0:
+					break
+
+				writer.write_many(helper.crop_frames(np.stack(batch), landmarks[start:start + len(batch)]))
+		frames.close()
+	else:
+		# this only loads the models the first time around in each worker
+		helper.load_models()
+
+		tracked = helper.track_faces(frames)
+		if tracked is None:
+			frames.close()
+			helper.save_landmarks(video_hash, np.zeros([0, 68, 2]))
+			shutil.rmtree(subdir_path)
+			return filename, video_hash, None
+
+		landmarks = []
+		with helper.EyeWriter(subdir_path) as writer:
+			while True:
+				batch = list(itertools.islice(tracked, consts.crop_batch_size))
+				if len(batch) == 0:
+					break
+
+				batch_landmarks = np.stack([helper.find_landmarks(frame, face_box) for frame, face_box in batch])
+				writer.write_many(helper.crop_frames(np.stack([frame for frame, _ in batch]), batch_landmarks))
+
+				landmarks.append(batch_landmarks)
+
+		helper.save_landmarks(video_hash, np.concatenate(landmarks))
+
+	# make a note of how many frames there were
+	with open(join(subdir_path, consts.num_total_file), 'w+') as f:
+		json.dump(writer.num_frames, f)
+
+	return filename, video_hash, writer.num_frames
+
+# `pool.imap_unordered` only passes a single argument
+def convert_video_args(args):
+	return convert_video(*args)
+
+# moves the results of converting a video to where they belong. Only called by the coordinator.
+def finish_video(filename, data_dir, from_source, converted):
+	subdir_name = subdir_for(filename)
+
+	# anything that's already there is from an older conversion
+	old_output = join(consts.data_dir, subdir_name)
+	if os.path.exists(old_output):
+		shutil.rmtree(old_output)
+
+	if converted:
+		helper.move(subdir_name, data_dir, consts.data_dir)
+
+	# save the original video to source data
+	if not from_source:
+		helper.move(filename, data_dir, consts.source_data_dir)
+
+# Converts every video in 'SourceData/' (if `from_source`) or 'Import/' (otherwise), with
+# `num_workers` processes. Returns False if it was stopped before finishing.
+def run(from_source, num_workers=consts.num_conversion_workers):
+	data_dir = consts.source_data_dir if from_source else consts.import_dir
+
+	# hidden files are still being copied in (see 'ingest_engine.py')
+	videos = sorted(f for f in os.listdir(data_dir) if os.path.isfile(join(data_dir, f)) and not f.startswith('.'))
+
+	# use `namespace` to rename the videos to unique names
+	if not from_source:
+		namespace = helper.get_namespace(None)
+		if namespace is None:
+			return False
+
+		progress = helper.load_progress()
+
+		# finish anything that was left over from last time
+		for filename, new_filename in list(progress['renames'].items()):
+			helper.finish_rename(namespace, progress, filename, new_filename)
+
+			if filename in videos:
+				videos[videos.index(filename)] = new_filename
+
+		for i, filename in enumerate(videos):
+			if not helper.is_renamed(filename):
+				videos[i] = helper.rename_with_namespace(namespace, progress, filename)
+
+	manifest = Manifest()
+	params_hash = helper.get_params_hash()
+
+	pending = []
+	for filename in videos:
+		video_hash = manifest.video_hash(join(data_dir, filename))
+
+		if manifest.is_up_to_date(subdir_for(filename), video_hash, params_hash):
+			# save the original video to source data
+			if not from_source:
+				helper.move(filename, data_dir, consts.source_data_dir)
+			continue
+
+		pending.append((filename, data_dir, video_hash))
+
+	helper.write_flush("Converting {} videos with {} workers ({} up to date)\n".format(
+		len(pending), num_workers, len(videos) - len(pending)))
+
+	pool = multiprocessing.Pool(num_workers, initializer=init_worker)
+	try:
+		results = pool.imap_unordered(convert_video_args, pending)
+		for i, (filename, video_hash, num_frames) in enumerate(results):
+			if num_frames is None:
+				helper.write_flush("\rCannot use video '{}', did not contain exactly one face.\n".format(filename))
+			finish_video(filename, data_dir, from_source, num_frames is not None)
+
+			# the video is only recorded once everything else is done
+			manifest.record(subdir_for(filename), video_hash, params_hash, num_frames)
+
+			helper.write_flush("\rConverted {}/{} videos".format(i+1, len(pending)))
+
+		pool.close()
+	except KeyboardInterrupt:
+		pool.terminate()
+		helper.write_flush("\nStopped. Run again to pick up where we left off.\n")
+		return False
+	except Exception:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+		manifest.close()
+
+	helper.write_flush("\nDone!\n")
+	return True
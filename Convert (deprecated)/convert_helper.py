@@ -3,7 +3,11 @@
 import os
 import sys
 import json
+import hashlib
+import itertools
+import subprocess
 
+import numpy as np
 import cv2
 import dlib
 
@@ -21,9 +25,18 @@ l_eye_r_edge = 39
 r_eye_l_edge = 42
 r_eye_r_edge = 45
 
-# pre-load the face-detection from dlib so they we have them while we do cropping
-detector = dlib.cnn_face_detection_model_v1(consts.face_detector_path)
-predictor = dlib.shape_predictor(consts.facial_landmark_detector_path)
+# the face-detection from dlib, which we need while we do cropping. These take a while to load, so
+# they're only loaded (with `load_models`) in the processes that actually use them.
+detector = None
+predictor = None
+
+def load_models():
+	global detector, predictor
+	if detector is not None:
+		return
+
+	detector = dlib.cnn_face_detection_model_v1(consts.face_detector_path)
+	predictor = dlib.shape_predictor(consts.facial_landmark_detector_path)
 
 previous_write = ""
 def write_flush(s):
@@ -69,8 +82,30 @@ def get_namespace(delayed_interrupt):
 	return namespace
 
 def update_namespace(new_namespace):
-	with open(consts.namespace_path, 'w+') as f:
-		json.dump(new_namespace, f)
+	write_json_atomic(consts.namespace_path, new_namespace)
+
+# writes `obj` to `path` as JSON, such that the file always holds either the old contents or the new
+# ones -- even if we're interrupted partway through
+def write_json_atomic(path, obj):
+	tmp_path = path + '.tmp'
+	with open(tmp_path, 'w+') as f:
+		json.dump(obj, f)
+		f.flush()
+		os.fsync(f.fileno())
+
+	os.replace(tmp_path, path)
+
+# The progress file holds the renames that have been started but might not have finished, as a
+# dict of {"renames": {old filename: new filename}}. See `rename_with_namespace`.
+def load_progress():
+	if not os.path.exists(consts.conversion_progress_path):
+		return {'renames': {}}
+
+	with open(consts.conversion_progress_path, 'r') as f:
+		return json.load(f)
+
+def save_progress(progress):
+	write_json_atomic(consts.conversion_progress_path, progress)
 
 # This function is separated so that it can be changed later
 def parse_import_filename(filename):
@@ -78,87 +113,428 @@ def parse_import_filename(filename):
 	# returns id, ext
 	return id_and_ext[0], id_and_ext[1]
 
-# renames the file with the given name, and returns the new name
+# files that have already been renamed are given as '$ID-$N.ext'
+def is_renamed(filename):
+	return '-' in parse_import_filename(filename)[0]
+
+# renames the file with the given name in 'Import/', updating `namespace`, and returns the new name
 #
-# This function assumes that our working directory is the top-level directory of the project
-def rename_with_namespace(delayed_interrupt, filename):
+# The rename is first written to the progress file, so that if we're stopped partway through,
+# `finish_rename` can complete it the next time around.
+def rename_with_namespace(namespace, progress, filename):
 	sentence_id, ext = parse_import_filename(filename)
 
-	namespace = get_namespace(delayed_interrupt)
-	if namespace is None:
-		return None
-
 	n = namespace[sentence_id] if sentence_id in namespace else 0
-	namespace[sentence_id] = n + 1
-
 	new_filename = "{}-{}.{}".format(sentence_id, n, ext)
-	new_filepath = os.path.join(consts.import_dir, new_filename)
-	old_filepath = os.path.join(consts.import_dir, filename)
-	os.rename(old_filepath, new_filepath)
 
-	# We wait until the end to update `namespace` because we don't want to write to the file with
-	# our changes to `namespace` until we know that we need to (i.e. until we've renamed the file)
-	#
-	# In reality, we wait on every part of this to finish, because of how it's called in
-	# `convert_script.py`, but -- in case that doesn't work (or the process is killed) -- it's good
-	# to be safe about it.
-	# The specific concern here is that `os.rename` fails
-	update_namespace(namespace)
+	progress['renames'][filename] = new_filename
+	save_progress(progress)
+
+	finish_rename(namespace, progress, filename, new_filename)
 
 	return new_filename
 
+# completes a rename started by `rename_with_namespace`. This can be safely repeated, no matter how
+# much of it was done before.
+def finish_rename(namespace, progress, filename, new_filename):
+	old_filepath = os.path.join(consts.import_dir, filename)
+	new_filepath = os.path.join(consts.import_dir, new_filename)
+	if os.path.exists(old_filepath):
+		os.rename(old_filepath, new_filepath)
+
+	# We wait until after renaming to update `namespace`, because we don't want to write to the
+	# file with our changes until we know that we need to (i.e. until we've renamed the file). If
+	# the file is gone altogether, there's nothing to record.
+	if os.path.exists(new_filepath):
+		sentence_id, n = parse_import_filename(new_filename)[0].split('-')
+		namespace[sentence_id] = max(namespace.get(sentence_id, 0), int(n) + 1)
+		update_namespace(namespace)
+
+	del progress['renames'][filename]
+	save_progress(progress)
+
 # moves the given directory entry (e.g. file, subdirectory) in `init_dir` with the given `filename`
 # into `targ_dir` 
 def move(filename, init_dir, targ_dir):
 	os.rename(os.path.join(init_dir, filename), os.path.join(targ_dir, filename))
 
-# makes a subdirectory with `subdir_name` within `containing_dir` and outputs a sequence of images to 
-def convert_to_imgs(filename, subdir_name, containing_dir):
-	filepath = os.path.join(containing_dir, filename)
-	
-	subdir_path = os.path.join(containing_dir, subdir_name)
-	os.makedirs(subdir_path)
+# returns the (width, height) of the frames that ffmpeg decodes from the video at `filepath`.
+#
+# Videos from phones are often stored sideways, with a tag saying how they should be rotated.
+# ffmpeg applies the rotation when decoding, so we have to account for it here, too.
+def video_size(filepath):
+	output = subprocess.check_output(['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+									  '-show_entries', 'stream=width,height:stream_tags=rotate:stream_side_data=rotation',
+									  '-of', 'json', filepath])
+	stream = json.loads(output)['streams'][0]
+
+	rotation = int(stream.get('tags', {}).get('rotate', 0))
+	for side_data in stream.get('side_data_list', []):
+		rotation = int(side_data.get('rotation', rotation))
+
+	if rotation % 180 != 0:
+		return stream['height'], stream['width']
+
+	return stream['width'], stream['height']
 
-	file_names = os.path.join(subdir_path, consts.img_file_format)
+# yields the frames of the video at `filepath`, resampled to `consts.fps`, as RGB images with shape
+# (height, width, 3).
+#
+# ffmpeg decodes the video straight into a pipe, so none of the full-size frames are ever written
+# to disk.
+def read_frames(filepath):
+	width, height = video_size(filepath)
+	frame_size = width * height * 3
+
+	process = subprocess.Popen(['ffmpeg', '-loglevel', 'panic', '-i', filepath, '-r', str(consts.fps),
+								'-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+							   stdout=subprocess.PIPE)
+
+	try:
+		while True:
+			buf = process.stdout.read(frame_size)
+			if len(buf) == 0:
+				break
+			if len(buf) != frame_size:
+				raise Exception("Video '{}' ended partway through a frame".format(filepath))
+
+			# dlib needs to be able to write to the image, so we can't use `buf` directly
+			yield np.frombuffer(buf, dtype=np.uint8).reshape([height, width, 3]).copy()
+	finally:
+		process.stdout.close()
+		# if we were stopped early, ffmpeg won't finish by itself
+		if process.poll() is None:
+			process.kill()
+		process.wait()
+
+	if process.returncode != 0:
+		raise Exception("ffmpeg failed to decode '{}'".format(filepath))
+
+# returns the coordinates of a dlib rectangle as (left, top, right, bottom)
+def box_coords(box):
+	return (box.left(), box.top(), box.right(), box.bottom())
+
+def box_center(box):
+	left, top, right, bottom = box_coords(box)
+	return ((left + right) / 2, (top + bottom) / 2)
+
+# returns the box a fraction `t` of the way from box `a` to box `b`
+def interpolate_box(a, b, t):
+	return dlib.rectangle(*[int(round(x + (y - x) * t)) for x, y in zip(box_coords(a), box_coords(b))])
+
+# returns the box of the face in `faces` (the output of `detector` on a single image) that's
+# closest to `previous_box`, or None if there aren't any
+def closest_face(faces, previous_box):
+	if len(faces) == 0:
+		return None
+
+	px, py = box_center(previous_box)
+
+	def distance(face):
+		x, y = box_center(face.rect)
+		return (x - px) ** 2 + (y - py) ** 2
+
+	return min(faces, key=distance).rect
+
+# Finds the face in every frame of a video. `frames` is an iterable of RGB images, as given by
+# `read_frames`.
+#
+# The first frame must contain exactly one face, otherwise this returns None. If it does, this
+# returns a generator of pairs of (frame, face_box) for every frame, in order.
+#
+# See the notes on `consts.face_detection_interval` for how the face is followed after that.
+def track_faces(frames):
+	frames = iter(frames)
+
+	first_frame = next(frames, None)
+	if first_frame is None:
+		return None
+
+	faces = detector(first_frame, 0)
+	if len(faces) != 1:
+		return None
 
-	os.system("ffmpeg -loglevel panic -i {} -r {} {}".format(filepath, consts.fps, file_names))
+	return tracked_faces(first_frame, faces[0].rect, frames)
 
-def crop_image(i, img_path, face_box):
-	# unfortunately, it appears we can't simply use the same image both times; we have to
-	# independently load it twice. In its C++ documentation, dlib lists `cv_image()` as a method
-	# for generating a dlib image from an opencv image, but that feature does not seem to be
-	# available for Python.
+# only for internal use; the generator returned by `track_faces`
+def tracked_faces(first_frame, first_box, frames):
+	yield first_frame, first_box
 
-	shape = predictor(dlib.load_rgb_image(img_path), face_box)
+	interval = consts.face_detection_interval
+	if interval is None:
+		for frame in frames:
+			yield frame, first_box
+		return
 
-	img = cv2.imread(img_path)
+	# the last frame that the face was detected in, which the next chunk starts from
+	key_frame, key_box = first_frame, first_box
 
+	while True:
+		# each chunk of frames holds one batch of frames to detect on
+		chunk = list(itertools.islice(frames, interval * consts.face_detection_batch_size))
+		if len(chunk) == 0:
+			return
+
+		# we detect on every `interval`th frame, as well as the last one, so that every frame is
+		# between two detections
+		samples = list(range(interval - 1, len(chunk), interval))
+		if len(samples) == 0 or samples[-1] != len(chunk) - 1:
+			samples.append(len(chunk) - 1)
+
+		detections = detector([chunk[i] for i in samples], 0, batch_size=len(samples))
+
+		previous = -1
+		for sample, faces in zip(samples, detections):
+			# if the face wasn't found, we'll assume it stayed where it was
+			box = closest_face(faces, key_box)
+			if box is None:
+				box = key_box
+
+			if consts.face_tracking == 'correlation':
+				tracker = dlib.correlation_tracker()
+				tracker.start_track(key_frame, key_box)
+
+			for i in range(previous + 1, sample):
+				if consts.face_tracking == 'correlation':
+					tracker.update(chunk[i])
+					p = tracker.get_position()
+					yield chunk[i], dlib.rectangle(int(p.left()), int(p.top()), int(p.right()), int(p.bottom()))
+				else:
+					yield chunk[i], interpolate_box(key_box, box, (i - previous) / (sample - previous))
+
+			yield chunk[sample], box
+
+			previous = sample
+			key_frame, key_box = chunk[sample], box
+
+# returns the 68 facial landmarks found by `predictor` in the given face, as a float32 array with
+# shape (68, 2) of (x, y) coordinates
+def find_landmarks(img, face_box):
+	shape = predictor(img, face_box)
+	return np.array([[p.x, p.y] for p in shape.parts()], dtype=np.float32)
+
+# returns the bounds of the region around each eye, as an int array with shape (..., 2, 4) -- left
+# eye first -- where each set of bounds is (x1, x2, y1, y2). `landmarks` has shape (..., 68, 2), so
+# this works for a single frame or many at once.
+def eye_bounds(landmarks):
 	output_dim_ratio = float(consts.output_height) / float(consts.output_width)
 
-	def crop_helper(write_file, l_edge_index, r_edge_index):
-		# get the bounds of the cropped region on the x-axis
-		x1 = shape.part(l_edge_index).x
-		x2 = shape.part(r_edge_index).x
+	l_edges = landmarks[..., [l_eye_l_edge, r_eye_l_edge], :]
+	r_edges = landmarks[..., [l_eye_r_edge, r_eye_r_edge], :]
 
-		# from our given x-axis bounds, determine our y coordinates. We'll center the cropped
-		# region at the average of the corners of the eye (given by the shape indexes)
-		y_center = (shape.part(l_edge_index).y + shape.part(r_edge_index).y) / 2
-		height = output_dim_ratio * (x2 - x1)
-		y1 = int(y_center - height/2)
-		y2 = int(y_center + height/2)
+	# get the bounds of the cropped region on the x-axis
+	x1 = l_edges[..., 0].astype(np.int64)
+	x2 = r_edges[..., 0].astype(np.int64)
 
-		# get the new, cropped image and scale it
-		new_img = img[y1:y2, x1:x2]
-		
-		scale_factor = float(consts.output_height) / float(int(height))
-		new_width = (x2 - x1) * scale_factor
-		new_height = (y2 - y1) * scale_factor
-		
-		new_img = cv2.resize(new_img, (int(new_width), int(new_height)))
+	# from our given x-axis bounds, determine our y coordinates. We'll center the cropped region at
+	# the average of the corners of the eye (given by the landmark indexes)
+	y_center = (l_edges[..., 1] + r_edges[..., 1]) / 2
+	height = output_dim_ratio * (x2 - x1)
+	y1 = (y_center - height/2).astype(np.int64)
+	y2 = (y_center + height/2).astype(np.int64)
+
+	return np.stack([x1, x2, y1, y2], axis=-1)
+
+# returns the regions around both eyes in `img`, stacked into a single array with shape
+# (2, output_height, output_width, 3) -- left eye first. `landmarks` is the output of
+# `find_landmarks`.
+#
+# The crops keep the channel order of `img`.
+def crop_eyes(img, landmarks):
+	eyes = np.empty([2, consts.output_height, consts.output_width, 3], dtype=np.uint8)
 
-		# save the image
-		cv2.imwrite(write_file, new_img)
+	for eye, (x1, x2, y1, y2) in enumerate(eye_bounds(landmarks)):
+		# get the new, cropped image and scale it. We scale straight to the output size (instead of
+		# by the ratio of the heights) so that every crop has exactly the same shape.
+		eyes[eye] = cv2.resize(img[y1:y2, x1:x2], (consts.output_width, consts.output_height))
 
-	crop_helper(consts.left_eye_format.format(i), l_eye_l_edge, l_eye_r_edge)
-	crop_helper(consts.right_eye_format.format(i), r_eye_l_edge, r_eye_r_edge)
+	return eyes
+
+# crops the eyes out of `frame`, an RGB image (as given by `read_frames`), returning them in the
+# format given by `crop_eyes` -- but in BGR, the channel order that OpenCV (and the rest of the
+# data) uses.
+#
+# The same buffer is given to both dlib and OpenCV, so nothing is copied or decoded again. Only the
+# (much smaller) crops have their channels reordered.
+def crop_frame(frame, landmarks):
+	eyes = crop_eyes(frame, landmarks)
+
+	# the channels are reordered for both eyes at once, by treating them as a single image
+	return cv2.cvtColor(eyes.reshape([-1, consts.output_width, 3]), cv2.COLOR_RGB2BGR).reshape(eyes.shape)
+
+# the same as `crop_frame`, but for an image file. The image is only decoded once. If the landmarks
+# for the image are already known (e.g. from the landmark cache), `predictor` isn't needed.
+def crop_image(img_path, face_box, landmarks=None):
+	img = dlib.load_rgb_image(img_path)
+	if landmarks is None:
+		landmarks = find_landmarks(img, face_box)
+
+	return crop_frame(img, landmarks)
+
+# only for internal use.
+# For resizing regions that start at `start` and have the given `size` (both arrays of the same
+# shape) to `output_size`, this returns the position in the source that each output position is
+# sampled from. The shape is the shape of `start`, plus a last axis of `output_size`.
+#
+# This is the same sampling that `cv2.resize` does: output pixel centers are mapped onto the
+# source, and anything past the edge uses the edge pixel.
+def resize_sample_positions(start, size, output_size):
+	scale = (size / float(output_size))[..., np.newaxis]
+	positions = (np.arange(output_size) + 0.5) * scale - 0.5
+
+	positions = np.clip(positions, 0, (size - 1)[..., np.newaxis])
+	return (start[..., np.newaxis] + positions).astype(np.float32)
+
+# The batched equivalent of `crop_frame`: crops and resizes the eyes for many frames at once.
+# `frames` is an array of RGB images with shape (frames, height, width, 3), and `landmarks` has
+# shape (frames, 68, 2).
+#
+# returns the eyes in BGR, with shape (frames, 2, output_height, output_width, 3)
+#
+# The regions are the same as in `crop_eyes`. Instead of resizing each one separately, the frames
+# are treated as a single tall image, and every eye is sampled out of it with one call to
+# `cv2.remap`, using the same bilinear sampling as `cv2.resize`. Results may differ from
+# `crop_frame` by one (out of 255) because of rounding.
+def crop_frames(frames, landmarks):
+	num_frames, img_height, img_width = frames.shape[:3]
+	output_shape = [2, consts.output_height, consts.output_width]
+
+	bounds = eye_bounds(landmarks)
+
+	# keep each region inside the image, with at least one pixel
+	x1 = np.clip(bounds[..., 0], 0, img_width - 1)
+	x2 = np.clip(bounds[..., 1], x1 + 1, img_width)
+	y1 = np.clip(bounds[..., 2], 0, img_height - 1)
+	y2 = np.clip(bounds[..., 3], y1 + 1, img_height)
+
+	# shape = (frames, 2, output_width) and (frames, 2, output_height)
+	x = resize_sample_positions(x1, x2 - x1, consts.output_width)
+	y = resize_sample_positions(y1, y2 - y1, consts.output_height)
+
+	eyes = np.empty([num_frames] + output_shape + [3], dtype=np.uint8)
+
+	# OpenCV can't remap images with more than SHRT_MAX (32767) rows, so the frames are done in
+	# groups small enough to fit
+	group_size = max(1, 32766 // img_height)
+	for start in range(0, num_frames, group_size):
+		end = min(start + group_size, num_frames)
+
+		# the row of each frame within the tall image
+		group_y = y[start:end] + (np.arange(end - start, dtype=np.float32) * img_height)[:, np.newaxis, np.newaxis]
+
+		map_x = np.broadcast_to(x[start:end, :, np.newaxis, :], [end - start] + output_shape)
+		map_y = np.broadcast_to(group_y[..., np.newaxis], [end - start] + output_shape)
+
+		tall = frames[start:end].reshape([-1, img_width, 3])
+		group = cv2.remap(tall, map_x.reshape([-1, consts.output_width]), map_y.reshape([-1, consts.output_width]),
+						  cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+		eyes[start:end] = group.reshape([end - start] + output_shape + [3])
+
+	# RGB -> BGR
+	return np.ascontiguousarray(eyes[..., ::-1])
+
+# returns the SHA-256 digest of the file at `path`, as a hex string
+def file_hash(path):
+	h = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			h.update(block)
+
+	return h.hexdigest()
+
+models_hash = None
+# returns a hash of everything other than the video itself that affects which landmarks are found
+# for each frame: dlib's model files and the way that the frames and faces are found.
+def get_models_hash():
+	global models_hash
+	if models_hash is not None:
+		return models_hash
+
+	h = hashlib.sha256()
+	for path in [consts.face_detector_path, consts.facial_landmark_detector_path]:
+		h.update(file_hash(path).encode('utf-8'))
+
+	h.update(json.dumps([consts.fps, consts.face_detection_interval, consts.face_detection_batch_size,
+						 consts.face_tracking]).encode('utf-8'))
+
+	models_hash = h.hexdigest()
+	return models_hash
+
+# returns a hash of everything that affects the output of converting a video, other than the video
+# itself
+def get_params_hash():
+	h = hashlib.sha256(get_models_hash().encode('utf-8'))
+	h.update(json.dumps([consts.output_height, consts.output_width, consts.write_packed_eyes,
+						 consts.packed_eyes_file, consts.left_eye_format, consts.right_eye_format]).encode('utf-8'))
+
+	return h.hexdigest()
+
+# The landmark cache holds the landmarks for every frame of each video that has been converted, so
+# that the eyes can be cropped again (e.g. at a different output size) without running dlib. Each
+# video's landmarks are stored in 'LandmarkCache/' as a float32 array with shape (frames, 68, 2),
+# named by the hash of the video and `get_models_hash()`. Videos that couldn't be used are stored
+# with no frames.
+def landmark_cache_path(video_hash):
+	return os.path.join(consts.landmark_cache_dir, "{}-{}.npy".format(video_hash, get_models_hash()[:16]))
+
+# returns the cached landmarks for the video with the given hash, or None if they aren't cached
+def load_landmarks(video_hash):
+	path = landmark_cache_path(video_hash)
+	if not os.path.exists(path):
+		return None
 
+	return np.load(path)
+
+def save_landmarks(video_hash, landmarks):
+	os.makedirs(consts.landmark_cache_dir, exist_ok=True)
+
+	path = landmark_cache_path(video_hash)
+	tmp_path = path + '.tmp'
+	with open(tmp_path, 'wb') as f:
+		np.save(f, landmarks.astype(np.float32))
+
+	os.replace(tmp_path, path)
+
+# Writes the cropped eyes (as given by `crop_frame`) for each frame of a video into `output_dir`,
+# in order. Each pair of eyes is either written as two JPEGs -- with `consts.left_eye_format` and
+# `consts.right_eye_format` -- or, if `packed` is True, appended to a single file of raw frames
+# (`consts.packed_eyes_file`), in the format used by 'packed_data.py'.
+class EyeWriter():
+	def __init__(self, output_dir, packed=consts.write_packed_eyes):
+		self.output_dir = output_dir
+		self.packed = packed
+		self.num_frames = 0
+
+		self.packed_file = None
+		if packed:
+			self.packed_file = open(os.path.join(output_dir, consts.packed_eyes_file), 'wb')
+
+	def write(self, eyes):
+		if self.packed:
+			self.packed_file.write(eyes.tobytes())
+		else:
+			cv2.imwrite(os.path.join(self.output_dir, consts.left_eye_format.format(self.num_frames)), eyes[0])
+			cv2.imwrite(os.path.join(self.output_dir, consts.right_eye_format.format(self.num_frames)), eyes[1])
+
+		self.num_frames += 1
+
+	# writes the eyes for many frames at once, as given by `crop_frames`
+	def write_many(self, eyes):
+		if self.packed:
+			self.packed_file.write(eyes.tobytes())
+			self.num_frames += len(eyes)
+		else:
+			for frame_eyes in eyes:
+				self.write(frame_eyes)
+
+	def close(self):
+		if self.packed_file is not None:
+			self.packed_file.close()
+			self.packed_file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.close()
@@ -0,0 +1,213 @@
+# Brings the videos uploaded to the server into the dataset as they arrive, instead of waiting for
+# them to be collected into 'Import/' by hand.
+#
+# The server ('Server/src/io.go') stores each upload in 'Server/data/' as
+# '<userID>/<sha256(sentence)>/<n>.mov', next to 'metadata-<n>.txt', which holds one 'key : value'
+# pair per line. The hash is turned back into a sentence id with `sets.id_from_hash`.
+#
+# The server directory is scanned every `consts.ingest_scan_interval` seconds, and each new upload is
+# put on a queue. A fixed number of tasks take uploads from the queue, so at most `num_workers`
+# videos are converted at once, each in its own process. For every upload, we:
+#   1. give it a name ('$ID-$N', as with 'convert_script.py'), which is reserved in the manifest
+#      (see 'manifest.py') before anything else, so that it keeps the same name if we're stopped,
+#   2. copy the video into 'SourceData/' (the server's copy is left alone),
+#   3. convert it with `convert_engine.convert_video`, and move the output into 'Data/'.
+# Uploads are recognised by the hash of the video, so nothing is converted twice, and the script can
+# be stopped at any time and started again later.
+#
+# This shares 'namespace.json' with 'convert_script.py', so the two shouldn't be run at the same
+# time.
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import hashlib
+import concurrent.futures
+
+import convert_helper as helper
+import convert_engine
+from manifest import Manifest
+
+# import `consts.py` from the parent directory
+from os.path import abspath, join, dirname
+sys.path.append(abspath(join(dirname(abspath(__file__)), '..')))
+import consts
+
+from Sentences import sets
+
+# returns the metadata file written by the server as a dict
+def parse_metadata(path):
+	metadata = {}
+	with open(path, 'r') as f:
+		for line in f:
+			key, sep, value = line.rstrip('\n').partition(' : ')
+			if sep != '':
+				metadata[key] = value
+
+	return metadata
+
+# returns a list of (video path, metadata path, sentence hash) for each upload in `server_dir` that
+# has finished being written
+def scan_uploads(server_dir=consts.server_data_dir, settle_time=consts.ingest_settle_time):
+	if not os.path.isdir(server_dir):
+		return []
+
+	now = time.time()
+
+	uploads = []
+	for user_id in sorted(os.listdir(server_dir)):
+		user_dir = join(server_dir, user_id)
+		if not os.path.isdir(user_dir):
+			continue
+
+		for sentence_hash in sorted(os.listdir(user_dir)):
+			sentence_dir = join(user_dir, sentence_hash)
+			if not os.path.isdir(sentence_dir):
+				continue
+
+			for filename in sorted(os.listdir(sentence_dir)):
+				n, ext = os.path.splitext(filename)
+				if ext != '.mov' or not n.isdigit():
+					continue
+
+				video_path = join(sentence_dir, filename)
+				metadata_path = join(sentence_dir, 'metadata-{}.txt'.format(n))
+
+				# The server writes the metadata after the video, so the upload is complete once the
+				# metadata is there and neither file has changed for a little while.
+				try:
+					last_modified = max(os.path.getmtime(video_path), os.path.getmtime(metadata_path))
+				except FileNotFoundError:
+					continue
+
+				if now - last_modified >= settle_time:
+					uploads.append((video_path, metadata_path, sentence_hash))
+
+	return uploads
+
+# copies the file at `src` to `dst`, via a hidden file so that it's never seen half-written
+def copy_atomic(src, dst):
+	tmp = join(dirname(dst), '.' + os.path.basename(dst))
+	shutil.copyfile(src, tmp)
+	os.replace(tmp, dst)
+
+class Ingester():
+	def __init__(self, namespace, num_workers=consts.num_conversion_workers):
+		self.namespace = namespace
+		self.num_workers = num_workers
+
+		self.manifest = Manifest()
+		self.params_hash = helper.get_params_hash()
+
+		self.queue = asyncio.Queue()
+		# the video paths of uploads that are in the queue (or being converted)
+		self.queued = set()
+		# the video paths of uploads that are done with, whether or not they could be used, so that
+		# they aren't looked at again
+		self.finished = set()
+
+	# returns a new name for a recording of the given sentence
+	def new_name(self, sentence_id):
+		sentence_id = str(sentence_id)
+
+		# if we're stopped before the name is reserved, this number is just skipped
+		n = self.namespace.get(sentence_id, 0)
+		self.namespace[sentence_id] = n + 1
+		helper.update_namespace(self.namespace)
+
+		return '{}-{}'.format(sentence_id, n)
+
+	async def scan(self):
+		loop = asyncio.get_running_loop()
+		uploads = await loop.run_in_executor(None, scan_uploads)
+
+		for upload in uploads:
+			video_path = upload[0]
+			if video_path not in self.queued and video_path not in self.finished:
+				self.queued.add(video_path)
+				self.queue.put_nowait(upload)
+
+	# returns the name of the recording made from the upload, or None if nothing new was made (i.e.
+	# it couldn't be used, or it was already up to date)
+	async def ingest(self, video_path, metadata_path, sentence_hash, pool):
+		loop = asyncio.get_running_loop()
+
+		sentence = parse_metadata(metadata_path).get('sentence')
+		if sentence is None or hashlib.sha256(sentence.encode('utf-8')).hexdigest() != sentence_hash:
+			helper.write_flush("\rMetadata for '{}' doesn't match its sentence, skipping.\n".format(video_path))
+			return None
+
+		sentence_id = sets.id_from_hash(sentence_hash)
+		if sentence_id is None:
+			helper.write_flush("\rSentence for '{}' isn't in 'sentences.txt', skipping.\n".format(video_path))
+			return None
+
+		stat = os.stat(video_path)
+		video_hash = self.manifest.cached_video_hash(stat)
+		if video_hash is None:
+			video_hash = await loop.run_in_executor(None, helper.file_hash, video_path)
+			self.manifest.cache_video_hash(stat, video_hash)
+
+		name = self.manifest.name_for(video_hash)
+		if name is None:
+			name = self.new_name(sentence_id)
+			self.manifest.reserve(name, video_hash)
+		elif self.manifest.is_up_to_date(name, video_hash, self.params_hash):
+			return None
+
+		filename = name + '.mov'
+		source_path = join(consts.source_data_dir, filename)
+		if not os.path.exists(source_path):
+			await loop.run_in_executor(None, copy_atomic, video_path, source_path)
+			# the copy has the same contents, so there's no need to read it again later
+			self.manifest.cache_video_hash(os.stat(source_path), video_hash)
+
+		_, _, num_frames = await loop.run_in_executor(pool, convert_engine.convert_video,
+													   filename, consts.source_data_dir, video_hash)
+		convert_engine.finish_video(filename, consts.source_data_dir, True, num_frames is not None)
+		self.manifest.record(name, video_hash, self.params_hash, num_frames)
+
+		if num_frames is None:
+			helper.write_flush("\rCannot use video '{}', did not contain exactly one face.\n".format(video_path))
+			return None
+
+		return name
+
+	async def work(self, pool):
+		while True:
+			video_path, metadata_path, sentence_hash = await self.queue.get()
+			try:
+				name = await self.ingest(video_path, metadata_path, sentence_hash, pool)
+				if name is not None:
+					helper.write_flush("\rIngested '{}' as '{}'\n".format(video_path, name))
+			except Exception as e:
+				# this is tried again the next time we're started
+				helper.write_flush("\rFailed to ingest '{}': {}\n".format(video_path, e))
+			finally:
+				self.queued.discard(video_path)
+				self.finished.add(video_path)
+				self.queue.task_done()
+
+	# Ingests uploads until stopped. If `once`, it stops after everything that's there now is done.
+	async def run(self, once=False):
+		pool = concurrent.futures.ProcessPoolExecutor(self.num_workers, initializer=convert_engine.init_worker)
+		workers = [asyncio.create_task(self.work(pool)) for _ in range(self.num_workers)]
+		try:
+			while True:
+				await self.scan()
+
+				if once:
+					await self.queue.join()
+					break
+
+				await asyncio.sleep(consts.ingest_scan_interval)
+		finally:
+			for w in workers:
+				w.cancel()
+			pool.shutdown(cancel_futures=True)
+			self.manifest.close()
+
+def run(namespace, num_workers=consts.num_conversion_workers, once=False):
+	asyncio.run(Ingester(namespace, num_workers).run(once))
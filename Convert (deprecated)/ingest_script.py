@@ -0,0 +1,42 @@
+# Adds the videos uploaded to the server (in 'Server/data/') to the dataset, converting each one as
+# it arrives. See 'ingest_engine.py' for how.
+#
+#
+# USAGE:
+# `python ingest_script.py` keeps watching for new uploads until it's stopped (e.g. with Ctrl-C).
+# With `--once`, it only converts the uploads that are there already, and then stops. The number of
+# videos to convert at once can also be given (e.g. `python ingest_script.py --once 4`), and
+# defaults to `consts.num_conversion_workers`.
+#
+# Like 'convert_script.py', this can be stopped at any point and run again to continue from where
+# it left off.
+
+import sys
+
+import convert_helper as helper
+import ingest_engine
+
+# import `consts.py` from the parent directory
+from os.path import abspath, join, dirname
+sys.path.append(abspath(join(dirname(abspath(__file__)), '..')))
+
+import consts
+
+if __name__ == '__main__':
+	args = sys.argv[1:]
+
+	once = '--once' in args
+	if once:
+		args.remove('--once')
+
+	num_workers = int(args[0]) if len(args) > 0 else consts.num_conversion_workers
+
+	namespace = helper.get_namespace(None)
+	if namespace is None:
+		sys.exit(1)
+
+	try:
+		ingest_engine.run(namespace, num_workers, once)
+	except KeyboardInterrupt:
+		helper.write_flush("\nStopped. Run again to pick up where we left off.\n")
+		sys.exit(1)
@@ -0,0 +1,108 @@
+# A record of every video that has been converted, so that conversion only has to do the videos
+# that are new or have changed.
+#
+# The manifest is an SQLite database ('consts.conversion_manifest_path') with two tables:
+# * `conversions` maps the name of each recording ('$ID-$N') to the hash of the video it was
+#   converted from, the hash of the parameters it was converted with (see
+#   `convert_helper.get_params_hash`), and its number of frames -- NULL if the video couldn't be
+#   used.
+# * `files` caches the hash of each video file, keyed by its device and inode, along with its size
+#   and modification time. As long as those haven't changed, the file doesn't need to be read
+#   again. Renaming or moving a file (within the same filesystem) keeps its inode, so the hash
+#   follows it from 'Import/' to 'SourceData/'.
+#
+# Only the coordinating process in 'convert_engine.py' (or 'ingest_engine.py') uses the manifest.
+
+import os
+import sys
+import sqlite3
+
+import convert_helper as helper
+
+# import `consts.py` from the parent directory
+from os.path import abspath, join, dirname
+sys.path.append(abspath(join(dirname(abspath(__file__)), '..')))
+import consts
+
+class Manifest():
+	def __init__(self, path=consts.conversion_manifest_path):
+		self.db = sqlite3.connect(path)
+
+		self.db.execute('''CREATE TABLE IF NOT EXISTS conversions (
+			name TEXT PRIMARY KEY,
+			video_hash TEXT NOT NULL,
+			params_hash TEXT NOT NULL,
+			num_frames INTEGER)''')
+		self.db.execute('''CREATE INDEX IF NOT EXISTS conversions_by_video ON conversions (video_hash)''')
+
+		self.db.execute('''CREATE TABLE IF NOT EXISTS files (
+			device INTEGER NOT NULL,
+			inode INTEGER NOT NULL,
+			size INTEGER NOT NULL,
+			mtime_ns INTEGER NOT NULL,
+			video_hash TEXT NOT NULL,
+			PRIMARY KEY (device, inode))''')
+
+		self.db.commit()
+
+	def close(self):
+		self.db.close()
+
+	# returns the hash of the video at `path` (as given by `convert_helper.file_hash`), only reading
+	# the file if it isn't in the cache
+	def video_hash(self, path):
+		stat = os.stat(path)
+
+		video_hash = self.cached_video_hash(stat)
+		if video_hash is None:
+			video_hash = helper.file_hash(path)
+			self.cache_video_hash(stat, video_hash)
+
+		return video_hash
+
+	# returns the cached hash of the file with the given `os.stat` result, or None if it isn't known
+	def cached_video_hash(self, stat):
+		row = self.db.execute('SELECT size, mtime_ns, video_hash FROM files WHERE device = ? AND inode = ?',
+							  (stat.st_dev, stat.st_ino)).fetchone()
+		if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+			return row[2]
+
+		return None
+
+	def cache_video_hash(self, stat, video_hash):
+		self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+						(stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, video_hash))
+		self.db.commit()
+
+	# returns the name of the recording that was made from the video with this hash, or None if
+	# there isn't one
+	def name_for(self, video_hash):
+		row = self.db.execute('SELECT name FROM conversions WHERE video_hash = ? LIMIT 1', (video_hash,)).fetchone()
+		return None if row is None else row[0]
+
+	# returns whether the recording with the given name was converted from this video, with these
+	# parameters, and its output is still in 'Data/'
+	def is_up_to_date(self, name, video_hash, params_hash):
+		row = self.db.execute('SELECT video_hash, params_hash, num_frames FROM conversions WHERE name = ?',
+							  (name,)).fetchone()
+		if row is None or row[0] != video_hash or row[1] != params_hash:
+			return False
+
+		# videos that couldn't be used have no output
+		if row[2] is None:
+			return True
+
+		return os.path.exists(join(consts.data_dir, name, consts.num_total_file))
+
+	# records that a recording has been given this name, but hasn't been converted yet. Until it's
+	# converted, it's never up to date.
+	def reserve(self, name, video_hash):
+		self.db.execute("INSERT OR REPLACE INTO conversions VALUES (?, ?, '', NULL)", (name, video_hash))
+		self.db.commit()
+
+	# records that the recording with the given name has been converted. `num_frames` is None if the
+	# video couldn't be used.
+	def record(self, name, video_hash, params_hash, num_frames):
+		self.db.execute('INSERT OR REPLACE INTO conversions VALUES (?, ?, ?, ?)',
+						(name, video_hash, params_hash, num_frames))
+		self.db.commit()
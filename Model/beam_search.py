@@ -0,0 +1,126 @@
+# Beam search decoding for `Speller`.
+#
+# Every hypothesis (beam) is kept as a separate entry in the batch given to `Speller.step`, so all
+# of the beams are advanced together in a single call, and forking a hypothesis is just a gather
+# over the batch dimension of the state.
+#
+# Hypotheses are finished once they output the end character, and their scores are normalised by
+# their length so that shorter sentences aren't favoured just for being short. We use the length
+# penalty from Google's NMT paper:
+#   "Google's Neural Machine Translation System: Bridging the Gap between Human and Machine
+#    Translation" (2016)
+#   link: https://arxiv.org/abs/1609.08144
+# which divides the total log probability by ((5 + length) / 6) ^ length_penalty.
+#
+# Other sources of information (like a lexicon or a language model) can be added to the search as
+# "scorers". A scorer keeps its own state for each beam, as a NumPy array with the beams along the
+# first axis, and provides three methods:
+#   initial_state(beam_width): returns the state for every beam at the start of a sentence
+#   scores(state): returns an array of shape (beam_width, output_size) that is added to the log
+#     probabilities of each output at this step. Outputs that aren't allowed at all are given -inf.
+#   advance(state, tokens): returns the state after each beam has chosen the output in `tokens`
+# The search stops early once none of the remaining hypotheses can make it into the results. That
+# relies on scores never going up as a hypothesis gets longer, so scorers should only give log
+# probabilities (or 0 and -inf), as the ones here do.
+
+import tensorflow as tf
+
+import numpy as np
+
+__all__ = ['beam_search']
+
+def length_normalize(scores, lengths, length_penalty):
+    return scores / (((5.0 + lengths) / 6.0) ** length_penalty)
+
+# encoded is the output of the Encoder for a single sequence (i.e. with a batch size of 1)
+# start_index and end_index are the outputs that mark the start and end of a sentence
+# scorers is a list of scorers, as described above
+#
+# returns a list of up to `top_k` pairs of (score, labels), best first, where `labels` is the list
+# of outputs chosen -- not including the start and end characters
+def beam_search(speller, encoded, start_index, end_index, beam_width=8, top_k=1, max_length=100,
+                length_penalty=0.6, scorers=()):
+    output_size = speller.fc.units
+
+    # every beam gets its own copy of the encoder output
+    values, lengths = speller.prepare(encoded)
+    encoded = (tf.tile(values, [beam_width, 1, 1]), tf.tile(lengths, [beam_width]))
+
+    state = speller.initial_state(beam_width)
+
+    # We start with a single hypothesis. The rest of the beams are given a score of -inf so that
+    # they'll be replaced on the first step instead of duplicating it.
+    scores = np.full([beam_width], -np.inf)
+    scores[0] = 0.0
+    tokens = np.full([beam_width], start_index)
+    history = np.zeros([beam_width, 0], dtype=np.int64)
+    scorer_states = [scorer.initial_state(beam_width) for scorer in scorers]
+
+    # list of (normalised score, labels)
+    finished = []
+
+    for step in range(max_length):
+        previous_output = tf.one_hot(tokens, output_size, dtype=tf.float32)
+        logits, state = speller.step(encoded, previous_output, state)
+
+        # shape = (beam_width, output_size)
+        candidates = scores[:, np.newaxis] + tf.nn.log_softmax(logits).numpy()
+        for scorer, scorer_state in zip(scorers, scorer_states):
+            candidates += scorer.scores(scorer_state)
+        candidates = candidates.reshape([-1])
+
+        # We take twice as many candidates as there are beams, so that there are still enough to
+        # fill the beams after the ones that finish are taken out. The candidates are sorted with
+        # the best first.
+        best = np.argpartition(-candidates, 2 * beam_width - 1)[:2 * beam_width]
+        best = best[np.argsort(-candidates[best], kind='stable')]
+        best = best[np.isfinite(candidates[best])]
+
+        parents = best // output_size
+        new_tokens = best % output_size
+
+        is_end = new_tokens == end_index
+        for i in np.nonzero(is_end)[0]:
+            labels = history[parents[i]]
+            score = length_normalize(candidates[best[i]], len(labels) + 1, length_penalty)
+            finished.append((score, labels.tolist()))
+
+        keep = np.nonzero(~is_end)[0][:beam_width]
+        if len(keep) == 0:
+            break
+
+        # if there aren't enough candidates left to fill every beam, the rest are filled with
+        # copies of the first, marked with a score of -inf so that they're never chosen
+        num_kept = len(keep)
+        keep = np.concatenate([keep, np.full([beam_width - num_kept], keep[0])])
+
+        parents = parents[keep]
+        tokens = new_tokens[keep]
+        scores = candidates[best[keep]]
+        scores[num_kept:] = -np.inf
+
+        # Early stopping: the score of a live hypothesis can only go down from here, but the length
+        # penalty divides it by more as it gets longer, so the best it could end up with is its
+        # current score normalised by the longest possible length (or, if the score is positive, by
+        # the shortest). Once that's no better than the top `top_k` finished hypotheses, none of
+        # the remaining ones can make it into the results.
+        if len(finished) >= top_k:
+            worst_result = sorted(f[0] for f in finished)[-top_k]
+            best_alive = scores[0]
+            final_length = max_length if best_alive <= 0 else step + 2
+            if worst_result >= length_normalize(best_alive, final_length, length_penalty):
+                break
+
+        history = np.concatenate([history[parents], tokens[:, np.newaxis]], axis=1)
+        state = tf.nest.map_structure(lambda s: tf.gather(s, parents), state)
+        scorer_states = [scorer.advance(scorer_state[parents], tokens)
+                         for scorer, scorer_state in zip(scorers, scorer_states)]
+
+    # if nothing finished within `max_length`, we'll just use what we have
+    if len(finished) == 0:
+        for score, labels in zip(scores, history):
+            if np.isfinite(score):
+                finished.append((length_normalize(score, len(labels), length_penalty), labels.tolist()))
+
+    finished.sort(key=lambda f: -f[0])
+    return finished[:top_k]
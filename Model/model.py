@@ -7,6 +7,10 @@
 #   images, we're using `item_shape` to indicate the shape of the items in any sequence, be it the
 #   input sequence of video frames or the condensed sequence passed between DSBLSTM layers
 #
+# * Everything here operates on batches of sequences. Sequences of different lengths are padded at
+#   the end to the length of the longest one in the batch, and their true lengths are passed
+#   alongside them.
+#
 # * On the general format of the total model: We have frame-by-frame input provided to the Watcher,
 #   which is composed of two parts: the convolutions of individual frames and the subsequent layers
 #   of stacked bidirectional RNNs (either LSTMs or GRUs). This is created by WatcherBuilder and
@@ -22,7 +26,30 @@ from tensorflow.keras import layers
 
 import numpy as np
 
-__all__ = ['DeepStackedBiRNNBuilder', 'Speller']
+__all__ = ['apply_per_frame', 'DeepStackedBiRNNBuilder', 'Speller']
+
+# applies `model` (which operates on individual frames) to every frame in a batch of sequences.
+#
+# inputs shape = (batch, time) + frame_shape
+# returns shape = (batch, time) + model output shape
+def apply_per_frame(model, inputs):
+    frames = tf.reshape(inputs, [-1] + inputs.shape[2:].as_list())
+    outputs = model(frames)
+
+    return tf.reshape(outputs, [-1, tf.shape(inputs)[1]] + outputs.shape[1:].as_list())
+
+# applies `layer` (which operates on single vectors, e.g. `layers.Dense`) to every item in a batch
+# of sequences that all have the same, known length, by running it on all of them as one batch.
+# A `layers.Dense` given the sequences directly does this with `tf.tensordot`, which transposes its
+# input with a permutation that XLA can't differentiate inside a loop (see `Attention.attend`).
+#
+# inputs shape = (batch, length, input_size)
+# returns shape = (batch, length, output_size)
+def apply_per_item(layer, inputs):
+    items = tf.reshape(inputs, [-1, inputs.shape[-1]])
+    outputs = layer(items)
+
+    return tf.reshape(outputs, [-1, inputs.shape[1], outputs.shape[-1]])
 
 # for use in DeepStackedBiRNNBuilder
 class ConcatPool(layers.Layer):
@@ -34,33 +61,50 @@ class ConcatPool(layers.Layer):
     def build(self, input_shape):
         return
 
+    # inputs shape = (batch, time, units)
+    # returns shape = (batch, time // factor, units * factor)
+    #
+    # Each group of `factor` consecutive time-steps is concatenated into one. Any time-steps left
+    # over at the end are dropped.
     def call(self, inputs):
-        # this is a special case that's only called during setup
-        if inputs.shape[0] is None:
-            return tf.concat([inputs, inputs], axis=2)
-
-        num_items = inputs.shape[0] // self.factor * self.factor
-
-        # new_shape = list(inputs.shape)
-        # new_shape[0] //= self.factor
-        # new_shape[-1] = -1
+        num_groups = tf.shape(inputs)[1] // self.factor
 
-        t = tf.reshape(inputs[:num_items], [inputs.shape[0] // self.factor, 1, -1])
-        return t
+        t = inputs[:, :num_groups * self.factor]
+        return tf.reshape(t, [tf.shape(inputs)[0], num_groups, inputs.shape[-1] * self.factor])
 
+# The model produced by `build()` takes three inputs: the left and right eyes, each a batch of
+# (padded) sequences of images with shape `input_shape`, and the number of frames in each sequence.
+# It outputs a pair of: the hidden sequences, with shape (batch, hidden_sequence_length,
+# hidden_size), and the length of each of those sequences. Positions past the end of a sequence
+# are zero.
+#
+# If `bidirectional` is False, only the forward pass is used, so the output at each time-step only
+# depends on the frames up to that point. This is what allows the encoder to be run on frames as
+# they come in -- see 'streaming.py'.
 class DeepStackedBiRNNBuilder:
-    def __init__(self, input_shape):
-        self.inputs = [keras.Input(shape=input_shape), keras.Input(shape=input_shape)]
-
-        # combine the two inputs
-        flattened_left = layers.Flatten()(self.inputs[0])
-        flattened_right = layers.Flatten()(self.inputs[1])
-        combined = tf.concat([flattened_left, flattened_right], axis=1)
-        # add a dimension to make it compatible
-        ins = tf.expand_dims(combined, axis=1)
-
+    def __init__(self, input_shape, bidirectional=True):
+        sequence_shape = [None] + list(input_shape)
+        self.inputs = [keras.Input(shape=sequence_shape), keras.Input(shape=sequence_shape),
+                       keras.Input(shape=[], dtype=tf.int32)]
+
+        # combine the two inputs, flattening each frame
+        frame_size = int(np.prod(input_shape))
+        flattened_left = layers.Reshape([-1, frame_size])(self.inputs[0])
+        flattened_right = layers.Reshape([-1, frame_size])(self.inputs[1])
+        ins = tf.concat([flattened_left, flattened_right], axis=2)
+
+        self.lengths = self.inputs[2]
+        self.bidirectional = bidirectional
+
+        # the forward pass, as a list of ('rnn', layer) and ('pool', factor), in order. This is
+        # used to run the same layers one chunk at a time in 'streaming.py'.
+        self.stages = []
+
+        # We only reverse the part of each sequence that's actually there, so that the padding
+        # stays at the end in both directions. Because of that, the padding can never affect the
+        # outputs at real time-steps, and we don't need to mask the RNNs.
         self.fw = ins
-        self.bw = tf.reverse(ins, [0])
+        self.bw = tf.reverse_sequence(ins, self.lengths, seq_axis=1, batch_axis=0) if bidirectional else None
 
         # last_birnn is (rnn_type, units, output_pooling, kwargs)
         self.last_birnn = None
@@ -77,17 +121,32 @@ class DeepStackedBiRNNBuilder:
 
         kwargs["return_sequences"] = True
 
-        self.fw = rnn_type(units, **kwargs)(self.fw)
-        self.bw = rnn_type(units, **kwargs)(self.bw)
+        self.add_rnn(rnn_type, units, kwargs)
 
         if output_pooling != 1:
-            self.fw = ConcatPool(output_pooling)(self.fw)
-            self.bw = ConcatPool(output_pooling)(self.bw)
+            self.add_pooling(output_pooling)
 
         self.last_birnn = (rnn_type, units, output_pooling, kwargs)
 
         return self
 
+    def add_rnn(self, rnn_type, units, kwargs):
+        fw_rnn = rnn_type(units, **kwargs)
+        self.fw = fw_rnn(self.fw)
+        self.stages.append(('rnn', fw_rnn))
+
+        if self.bidirectional:
+            self.bw = rnn_type(units, **kwargs)(self.bw)
+
+    def add_pooling(self, factor):
+        self.fw = ConcatPool(factor)(self.fw)
+        self.stages.append(('pool', factor))
+
+        if self.bidirectional:
+            self.bw = ConcatPool(factor)(self.bw)
+
+        self.lengths = self.lengths // factor
+
     def repeat(self, n):
         self.check_build_status()
 
@@ -97,12 +156,10 @@ class DeepStackedBiRNNBuilder:
         (rnn_type, units, output_pooling, kwargs) = self.last_birnn
 
         for i in range(n):
-            self.fw = rnn_type(units, **kwargs)(self.fw)
-            self.bw = rnn_type(units, **kwargs)(self.bw)
+            self.add_rnn(rnn_type, units, kwargs)
 
             if output_pooling != 1:
-                self.fw = ConcatPool(output_pooling)(self.fw)
-                self.bw = ConcatPool(output_pooling)(self.bw)
+                self.add_pooling(output_pooling)
 
         return self
 
@@ -112,11 +169,21 @@ class DeepStackedBiRNNBuilder:
         # concatenate outputs to be given for each temporal slice so that we get both passes
         # (forward and backward) in the right order, then construct the model.
 
-        self.bw = tf.reverse(self.bw, [0])
+        if self.bidirectional:
+            self.bw = tf.reverse_sequence(self.bw, self.lengths, seq_axis=1, batch_axis=0)
+
+            outputs = tf.concat([self.fw, self.bw], axis=2)
+        else:
+            outputs = self.fw
+
+        # zero out everything past the end of each sequence, so that the padding looks the same
+        # as if we had walked off the end of a single sequence
+        mask = tf.sequence_mask(self.lengths, maxlen=tf.shape(outputs)[1], dtype=outputs.dtype)
+        outputs = outputs * tf.expand_dims(mask, axis=2)
 
-        outputs = tf.squeeze(tf.concat([self.fw, self.bw], axis=2), axis=1)
+        self.built = True
 
-        return keras.Model(inputs=self.inputs, outputs=outputs)
+        return keras.Model(inputs=self.inputs, outputs=[outputs, self.lengths])
 
 
 # This is our attention model, which is based on the attention model from:
@@ -169,10 +236,13 @@ class Attention(tf.keras.Model):
         # their own biases.
         self.w = layers.Dense(1)
 
-        # if not None, then it has the shape of a 1D array
+        # if not None, then these hold one entry for each sequence in the batch
         self.previous_attention = None
         self.previous_window_bounds = None
 
+        # the values given on the first round, padded by `pad_values`
+        self.padded_values = None
+
         self.bounds_restriction = None
 
     # This should be called at the end of every sequence prediction, once all characters have been
@@ -180,124 +250,179 @@ class Attention(tf.keras.Model):
     def reset(self):
         self.previous_attention = None
         self.previous_window_bounds = None
+        self.padded_values = None
 
     # sets a restriction on where we can center the attention.
+    #
+    # `bounds_restriction` is given the bounds of the previous windows (or None, on the first
+    # round) as a pair of tensors of (lower, upper), with one entry per sequence in the batch, and
+    # returns the range that the new median must be within, in the same format.
     def set_bounds_restriction(self, bounds_restriction):
         self.bounds_restriction = bounds_restriction
 
-    def remove_bounds_restriction():
+    def remove_bounds_restriction(self):
         self.bounds_restriction = None
 
     def window_size(self):
         return self.w_l + 1 + self.w_r
 
-    # only for internal use.
-    # takes window bounds (which may walk off the end of 'values') and returns a nicely padded
-    # window.
-    #
-    # returns window with shape (1, window_size, hidden_size)
-    def window_helper(values, bounds):
-        # lb for lower bound, ub for upper bound
-        (lb, ub) = bounds
-
-        seq_len = values.shape[0]
-
-        window = values[max(lb, 0):min(ub, seq_len), ...]
-        if lb < 0:
-            window = tf.pad(window, [[-1 * lb, 0], [0, 0]], "CONSTANT")
-        if ub > seq_len-1:
-            diff = ub - seq_len #-1
-            window = tf.pad(window, [[0, diff], [0, 0]], "CONSTANT")
-
-        return tf.expand_dims(window, 0)
-
-    # returns window, with shape = (1, window_size, hidden_size)
+    # returns windows, with shape = (batch, window_size, hidden_size)
     #
-    # does not allow a window to be centered outside 'values'
-    def get_window(self, values):
+    # does not allow a window to be centered outside of its sequence in 'values'
+    def get_window(self, values, lengths):
         # if this is the first round, just center the attention as close to the start as we can.
         if self.previous_attention is None:
-            m = 0 if self.bounds_restriction is None else self.bounds_restriction(None)[0]
+            # 'values' stays the same for the whole sequence, so it only needs to be padded once
+            self.padded_values = self.pad_values(values)
 
-            # we include the +1 because we want to go 'w_r' units out from the center. This is just
-            # like a normal range: [lower, upper)
-            self.previous_window_bounds = (m - self.w_l, m + self.w_r +1)
-            return Attention.window_helper(values, self.previous_window_bounds)
+            m = 0 if self.bounds_restriction is None else self.bounds_restriction(None)[0]
+            m = tf.broadcast_to(tf.cast(m, tf.int32), [values.shape[0]])
+
+            window_start = m - self.w_l
+        else:
+            # we'll use available_range to define the range that we're allowed to choose our
+            # median within
+            available_range = (self.bounds_restriction(self.previous_window_bounds)
+                               if self.bounds_restriction is not None
+                               else (0, lengths))
+
+            window_start = self.next_window_start(self.previous_attention,
+                                                  self.previous_window_bounds[0],
+                                                  available_range)
+
+        # we include the +1 because we want to go 'w_r' units out from the center. This is just
+        # like a normal range: [lower, upper)
+        self.previous_window_bounds = (window_start, window_start + self.w_l + self.w_r + 1)
+        return self.gather_window(self.padded_values, window_start)
+
+    # values has shape (batch, hidden_sequence_length, hidden_size)
+    # lengths has shape (batch), giving the length of each sequence in 'values'
+    # previous_rnn_state has shape (batch, rnn_state_size)
+    # returns the context vector, with shape (batch, hidden_size)
+    def call(self, values, lengths, previous_rnn_state):
+        # window has shape (batch, window_size, hidden_size)
+        window = self.get_window(values, lengths)
+
+        # we need the shape to be (batch, window_size, 1)
+        if self.previous_attention is None:
+            self.previous_attention = tf.zeros([values.shape[0], self.window_size(), 1])
 
+        context_vector, self.previous_attention = self.attend(window, self.previous_attention, previous_rnn_state)
 
-        # we'll use available_range to define the range that we're allowed to choose our median
-        # within
-        available_range = (self.bounds_restriction(self.previous_window_bounds)
-                           if self.bounds_restriction is not None
-                           else (0, self.window_size()))
+        return context_vector
 
-        # take only the overlap of the two ranges. Even without bound restrictions, this is
-        # necessary because the previous window may have gone outside the edge of 'values'
-        #
-        # lower >= 0, upper <= len(previous_attention)
-        lower = max(available_range[0], self.previous_window_bounds[0]) - self.previous_window_bounds[0]
-        upper = min(available_range[1], self.previous_window_bounds[1]) - self.previous_window_bounds[0]
-
-        # we're squeezing here because the previous_attention has shape (1, window_size)
-        a = tf.squeeze(self.previous_attention)[lower:upper].numpy()
-        
-        # get index of median. This seems to be the fastest supported way to do this, per this
-        # post:
-        # https://stackoverflow.com/questions/32923605/is-there-a-way-to-get-the-index-of-the-median-in-python-in-one-command
-        m = np.argsort(a)[len(a) // 2]
-        
-        # now that we have our median in terms of its position in the previous window, we get its
-        # absolute position in 'values'
-        m += self.previous_window_bounds[0]
-
-        # set new bounds. See comment above near the top of this function about the +1
-        self.previous_window_bounds = (m - self.w_l, m + self.w_r +1)
-        return Attention.window_helper(values, self.previous_window_bounds)
-
-    # values has shape (hidden_sequence_length, hidden_size)
-    # previous_rnn_state has shape (rnn_state_size)
-    # returns the context vector and the bounds of the window
+    # only for internal use.
+    # computes the attention over the given window, returning the context vector and the new
+    # attention weights.
     #
-    # Will return 'None' if the window is outside of the bounds of the hidden layer
-    def call(self, values, previous_rnn_state):
-        # window has shape (1, window_size, hidden_size)
-        window = self.get_window(values)
-        if window is None:
-            return None
-
-        # we need the shape to be (1, window_size, 1)
-        if self.previous_attention is None:
-            self.previous_attention = tf.zeros([1, self.window_size(), 1])
-
+    # window has shape (batch, window_size, hidden_size)
+    # previous_attention has shape (batch, window_size, 1)
+    # previous_rnn_state has shape (batch, rnn_state_size)
+    def attend(self, window, previous_attention, previous_rnn_state):
         # in the paper, this is notated as 'F'
-        # shape = (1, window_size, kernel_size)
-        features = self.Q(tf.pad(self.previous_attention, self.padding_shape))
-        # shape = (1, window_size, units)
-        _V = self.V(window)
-        _U = self.U(features)
+        # shape = (batch, window_size, kernel_size)
+        features = self.Q(tf.pad(previous_attention, self.padding_shape))
+        # shape = (batch, window_size, units)
+        #
+        # The dense layers are applied with `apply_per_item`, so that this can be compiled with XLA
+        # as part of the loop in `make_compiled_train_step` (in 'helper.py').
+        _V = apply_per_item(self.V, window)
+        _U = apply_per_item(self.U, features)
 
-        # at first, _W has shape (1, units), so we repeat it to be (1, window_size, units)
-        _W = self.W(previous_rnn_state)
-        _W = tf.reshape(tf.tile(_W, [1, self.window_size()]), _V.shape)
+        # _W has shape (batch, units), so we add the time axis for it to be broadcast across the
+        # window
+        _W = tf.expand_dims(self.W(previous_rnn_state), axis=1)
 
         # notated as 'e_t'
-        # shape = (1, window_size, 1)
-        scores = self.w(tf.nn.tanh(_V + _W + _U))
+        # shape = (batch, window_size, 1)
+        scores = apply_per_item(self.w, tf.nn.tanh(_V + _W + _U))
 
         # notated as '\alpha_t' and 'c_t', respectively
-        # shape = (1, window_size, 1)
-        attention_weights = tf.nn.softmax(scores)
-        self.previous_attention = attention_weights
+        # shape = (batch, window_size, 1)
+        #
+        # the softmax is taken across the window. It's done on the last axis (and the axis of size 1
+        # is put back afterwards), because a softmax over any other axis also transposes its input.
+        attention_weights = tf.expand_dims(tf.nn.softmax(tf.squeeze(scores, axis=2)), axis=2)
 
-        # shape = (1, window_size, hidden_size)
+        # shape = (batch, window_size, hidden_size)
         context = attention_weights * window
 
         # sum the various parts to produce a single, weighted vector -- this is an extension of
         # Bahdanau attention.
-        # shape = (1, hidden_size) after reduction
+        # shape = (batch, hidden_size) after reduction
         context_vector = tf.reduce_sum(context, axis=1)
 
-        return context_vector
+        return context_vector, attention_weights
+
+    # only for internal use.
+    # pads 'values' so that every position a window can cover has an index. Window positions range
+    # from w_l before the start of a sequence to w_r past its last item.
+    def pad_values(self, values):
+        return tf.pad(values, [[0, 0], [self.w_l, self.w_r], [0, 0]])
+
+    # only for internal use.
+    # returns the windows starting at `window_start`, with shape (batch, window_size, hidden_size),
+    # from values that have already been padded with `pad_values`
+    def gather_window(self, padded_values, window_start):
+        indices = tf.expand_dims(window_start + self.w_l, axis=1) + tf.range(self.window_size())
+        return tf.gather(padded_values, indices, batch_dims=1)
+
+    # only for internal use.
+    # returns the start of the next window: centered at the median of the attention over the
+    # current window, restricted to `available_range` (a pair of absolute (lower, upper) bounds).
+    def next_window_start(self, attention, window_start, available_range):
+        lower = tf.reshape(tf.cast(available_range[0], tf.int32), [-1, 1])
+        upper = tf.reshape(tf.cast(available_range[1], tf.int32), [-1, 1])
+
+        # absolute positions of each part of the window in 'values'. We only look at the overlap
+        # of the window and the available range -- even without bound restrictions, this is
+        # necessary because the window may have gone outside the edge of 'values'
+        positions = tf.expand_dims(window_start, axis=1) + tf.range(self.window_size())
+        in_range = (positions >= lower) & (positions < upper)
+
+        # To get the median of just the overlap for every sequence at once, everything outside of
+        # it is pushed to the end of the sort order, so that the median is the middle of what's
+        # left.
+        a = tf.where(in_range, tf.squeeze(attention, axis=2), np.inf)
+        order = tf.argsort(a, axis=1, stable=True)
+
+        count = tf.reduce_sum(tf.cast(in_range, tf.int32), axis=1)
+
+        # now that we have our median in terms of its position in the window, we get its absolute
+        # position in 'values'
+        m = tf.gather(order, count // 2, batch_dims=1) + window_start
+
+        return m - self.w_l
+
+    # ***********************************************************
+    # STATELESS INTERFACE
+    # ***********************************************************
+    #
+    # `call` keeps its state between steps on the object itself, which doesn't work inside a
+    # compiled `tf.function` (or when the state needs to be split up, like for beam search). The
+    # methods below do the same thing, but pass the state in and out explicitly. The state is a
+    # pair of:
+    #   previous_attention: shape = (batch, window_size, 1)
+    #   window_start: shape = (batch); the lower bound of the window to use for the next step
+    #
+    # 'values' must be padded once with `pad_values` before it's given to `step`. Bounds
+    # restrictions are not supported here.
+
+    def initial_state(self, batch_size):
+        # the first window is centered as close to the start as we can, just like in `get_window`
+        return (tf.zeros([batch_size, self.window_size(), 1]),
+                tf.fill([batch_size], tf.constant(-self.w_l, dtype=tf.int32)))
+
+    # the stateless equivalent of `call`. Returns the context vector and the new state.
+    def step(self, padded_values, lengths, previous_rnn_state, state):
+        previous_attention, window_start = state
+
+        window = self.gather_window(padded_values, window_start)
+        context_vector, attention_weights = self.attend(window, previous_attention, previous_rnn_state)
+
+        window_start = self.next_window_start(attention_weights, window_start, (0, lengths))
+
+        return context_vector, (attention_weights, window_start)
 
 
 # speller takes as input the hidden layer produced by Watcher and provides output probabilities of
@@ -309,46 +434,81 @@ class Speller(tf.keras.Model):
         super(Speller, self).__init__()
 
         self.attention = Attention(attn_units, attn_conv_features, attn_window[0], attn_window[1])
-        self.rnn = layers.GRU(rnn_units, return_sequences=True, return_state=True)
+        self.rnn = layers.GRUCell(rnn_units)
         self.fc = layers.Dense(output_size)
 
         self.previous_rnn_state = None
 
-    # values is the output from the Encoder
+    # encoded is the output from the Encoder: a pair of (values, lengths)
     # previous_output is a one-hot vector corresponding to the chosen output at the last time-step
     #
-    # values shape = (1, hidden_sequence_length, hidden_size)
-    # previous_output shape = (1, output_size)
+    # values shape = (batch, hidden_sequence_length, hidden_size)
+    # lengths shape = (batch)
+    # previous_output shape = (batch, output_size)
     #
-    # returns output: shape = (1, output_size); rnn_state: shape = (1, state_size)
-    def call(self, values, previous_output):
+    # returns output: shape = (batch, output_size); rnn_state: shape = (batch, state_size)
+    def call(self, encoded, previous_output):
+        values, lengths = encoded
+        batch_size = values.shape[0]
+
         # This shouldn't typically be true, becase we'll feed it the start character
         if previous_output is None:
-            previous_output = tf.zeros([1, self.fc.units])
+            previous_output = tf.zeros([batch_size, self.fc.units])
 
         # we need to supply a state to the attention, because it doesn't have its own handling for
         # the 0th state.
         if self.previous_rnn_state is None:
-            self.previous_rnn_state = tf.zeros([1, self.rnn.units])
+            self.previous_rnn_state = tf.zeros([batch_size, self.rnn.units])
 
-        # shape = (1, hidden_size)
-        context_vector = self.attention(values, self.previous_rnn_state)
+        # shape = (batch, hidden_size)
+        context_vector = self.attention(values, lengths, self.previous_rnn_state)
 
-        # rnn expects shape with ndims=3, so we need to add another dimension here
-        # input shape = (1, 1, hidden_size + output_size)
-        # rnn_output shape = (1, 1, rnn_output_size)
-        # state shape = (1, state_size)
-        rnn_output, state = self.rnn(tf.expand_dims(tf.concat([context_vector, previous_output], 1), axis=1))
+        output, state = self.spell(context_vector, previous_output, self.previous_rnn_state)
         self.previous_rnn_state = state
 
-        # shape = (1, rnn_output_size)
-        rnn_output = tf.squeeze(rnn_output, axis=1)
+        return output, state
 
-        # shape = (1, output_size)
+    # only for internal use.
+    # runs the rnn and output layer for a single step, returning the output and the new rnn state
+    def spell(self, context_vector, previous_output, previous_rnn_state):
+        # The rnn is a single cell rather than a whole `layers.GRU`, because it's only ever run for one
+        # step at a time -- and XLA can't differentiate the GRU layer's fused implementation inside
+        # an in-graph loop (see `make_compiled_train_step` in 'helper.py').
+        # input shape = (batch, hidden_size + output_size)
+        # rnn_output shape = (batch, rnn_output_size)
+        # state shape = (batch, state_size)
+        rnn_output, states = self.rnn(tf.concat([context_vector, previous_output], 1), [previous_rnn_state])
+        state = states[0]
+
+        # shape = (batch, output_size)
         output = self.fc(rnn_output)
 
         return output, state
 
+    # The stateless equivalent of `call`, for use in compiled functions -- see the notes in
+    # `Attention` on its stateless interface. The state is a pair of (rnn_state, attention_state),
+    # and the initial state is given by `initial_state`.
+    #
+    # `encoded` must first be passed through `prepare`, once for the whole sequence.
+    #
+    # returns output: shape = (batch, output_size), and the new state
+    def step(self, encoded, previous_output, state):
+        padded_values, lengths = encoded
+        previous_rnn_state, attention_state = state
+
+        context_vector, attention_state = self.attention.step(padded_values, lengths, previous_rnn_state, attention_state)
+        output, rnn_state = self.spell(context_vector, previous_output, previous_rnn_state)
+
+        return output, (rnn_state, attention_state)
+
+    def initial_state(self, batch_size):
+        return (tf.zeros([batch_size, self.rnn.units]), self.attention.initial_state(batch_size))
+
+    # prepares the output of the Encoder for use with `step`
+    def prepare(self, encoded):
+        values, lengths = encoded
+        return (self.attention.pad_values(values), lengths)
+
     def reset(self):
         self.attention.reset()
         self.previous_rnn_state = None
@@ -0,0 +1,99 @@
+# Runs the encoder built by `DeepStackedBiRNNBuilder` on frames as they come in, instead of on a
+# whole recording at once. This is what allows a sentence to be interpreted while it's still being
+# written, rather than only once the recording has finished.
+#
+# Only encoders built with `bidirectional=False` can be streamed: the backward pass needs the last
+# frame before it can output anything for the first.
+#
+# The encoder's own layers are reused, so a streaming encoder always has the same weights as the
+# one it was made from. Each chunk of frames is run through every stage in turn, with:
+#   * each RNN starting from the state that it finished the previous chunk with, and
+#   * each `ConcatPool` keeping the time-steps that don't fill a whole group until the next chunk
+#     provides the rest.
+# So, the output is exactly what the full encoder would give for the frames so far, but the work
+# done for each chunk only depends on the size of the chunk.
+
+import tensorflow as tf
+from tensorflow.keras import layers
+
+import numpy as np
+
+from .model import ConcatPool
+
+__all__ = ['StreamingWatcher']
+
+class StreamingWatcher():
+    # builder is a `DeepStackedBiRNNBuilder` that has already been built
+    def __init__(self, builder):
+        if builder.bidirectional:
+            raise Exception('Only encoders built with bidirectional=False can be streamed')
+        if not builder.built:
+            raise Exception('Encoder has not been built yet')
+
+        # the same stages as the encoder, where each RNN is wrapped so that it also gives its
+        # final state. The wrapper shares the cell (and therefore its weights) with the original.
+        self.stages = []
+        for kind, stage in builder.stages:
+            if kind == 'rnn':
+                self.stages.append((kind, layers.RNN(stage.cell, return_sequences=True, return_state=True)))
+            else:
+                self.stages.append((kind, (stage, ConcatPool(stage))))
+
+        self.reset()
+
+    # This should be called before starting on a new set of sequences.
+    def reset(self):
+        # for each stage, either the state of the RNN or the time-steps waiting to be pooled. None
+        # before the first chunk.
+        self.states = [None] * len(self.stages)
+
+        # the outputs so far, one tensor per chunk
+        self.outputs = []
+
+    # left and right are the next chunk of frames for each eye, after the convolutional layers
+    # (i.e. the same as the first two inputs to the encoder, but only for the new frames). Every
+    # sequence in the batch must be given the same number of frames.
+    #
+    # returns the new outputs of the encoder, with shape (batch, new_time_steps, hidden_size).
+    # Because of pooling, this may be empty.
+    def push(self, left, right):
+        batch_size = left.shape[0]
+        frame_size = int(np.prod(left.shape[2:]))
+
+        x = tf.concat([tf.reshape(left, [batch_size, -1, frame_size]),
+                       tf.reshape(right, [batch_size, -1, frame_size])], axis=2)
+
+        for i, (kind, stage) in enumerate(self.stages):
+            if kind == 'rnn':
+                # nothing new has made it this far, so the RNN stays where it is
+                if x.shape[1] == 0:
+                    x = tf.zeros([batch_size, 0, stage.cell.units])
+                    continue
+
+                results = stage(x, initial_state=self.states[i])
+                x, self.states[i] = results[0], list(results[1:])
+            else:
+                factor, pool = stage
+
+                if self.states[i] is not None:
+                    x = tf.concat([self.states[i], x], axis=1)
+
+                # the time-steps that don't make up a whole group are saved for next time
+                num_pooled = x.shape[1] // factor * factor
+                self.states[i] = x[:, num_pooled:]
+                x = pool(x)
+
+        self.outputs.append(x)
+        return x
+
+    # returns the output of the encoder for every frame so far, in the same format as the encoder
+    # itself: a pair of (values, lengths)
+    def encoded(self):
+        values = tf.concat(self.outputs, axis=1)
+        lengths = tf.fill([values.shape[0]], values.shape[1])
+
+        return (values, lengths)
+
+    # returns the number of time-steps that have been output so far
+    def length(self):
+        return sum(o.shape[1] for o in self.outputs)
@@ -6,10 +6,10 @@ from model import *
 
 print('Testing a sample model')
 
-# define the necessary input
-sample_input = tf.random.uniform([60, 100, 100, 3])
-input_shape = sample_input.shape[1:]
-seq_len = sample_input.shape[0]
+# define the necessary input: a batch of two sequences, where the second is shorter than the first
+sample_input = tf.random.uniform([2, 60, 100, 100, 3])
+sample_lengths = tf.constant([60, 45])
+input_shape = sample_input.shape[2:]
 
 # base convolutional operations
 video_stream = keras.Input(shape=input_shape)
@@ -40,6 +40,7 @@ rnn_units = 20
 output_size = 30
 speller = Speller(attn_units, attn_conv_features, attn_window, rnn_units, output_size)
 
-output, _ = speller(dsbrnn(img_converter(sample_input)), None)
+frames = apply_per_frame(img_converter, sample_input)
+output, _ = speller(dsbrnn([frames, frames, sample_lengths]), None)
 print('sample output:', output)
 print('done testing!')
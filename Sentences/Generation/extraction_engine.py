@@ -0,0 +1,84 @@
+# Runs the sentence extraction from 'sentence_extractor.py' on many videos at once, with a pool of
+# worker processes. This can be imported to regenerate the sentences from other scripts, e.g. after
+# changing one of the rules.
+#
+# The subtitles for each video are handled independently, so the video ids are handed out to the
+# workers in chunks, and the results are collected back in their original order (with `Pool.imap`).
+# The output is therefore exactly the same as doing the videos one at a time. Each worker has its
+# own `SentenceExtractor`, made once when it starts. Only this process writes to the output file,
+# which is kept open (and buffered) for the whole run.
+
+import os
+import sys
+import multiprocessing
+
+import gen_consts as gconsts
+from sentence_extractor import SentenceExtractor, load_lexicon
+
+progress_width = 30
+
+# the size of the output buffer, in bytes
+write_buffer_size = 1 << 20
+
+# the extractor for this worker process
+extractor = None
+
+def init_worker(lexicon):
+	global extractor
+	extractor = SentenceExtractor(lexicon)
+
+# returns the path of the subtitles for the video, or None if there aren't any
+def subtitles_path(video_id):
+	# The file format is:
+	# $VIDEOID.en.vtt
+	# but we're using gen_consts.ext to cover for the last bit
+	filepath = os.path.join(gconsts.subtitles_dir, "{}.{}".format(video_id, gconsts.ext))
+	if not os.path.exists(filepath):
+		return None
+
+	return filepath
+
+# returns the list of sentences from the subtitles for the video, or None if there aren't any
+# subtitles. Runs in a worker process. The file is parsed as it's read, one line at a time.
+def do_video(video_id):
+	filepath = subtitles_path(video_id)
+	if filepath is None:
+		return None
+
+	with open(filepath) as f:
+		return extractor.extract_lines(f)
+
+# returns the text written to the output file for the sentences from one video. If `debug`, each
+# set of sentences is labelled with the id of its video.
+def format_sentences(video_id, sentences, debug=False):
+	if debug:
+		sentences = ['\t' + s for s in sentences]
+		return video_id + '\n' + '\n'.join(sentences) + '\n'
+
+	return '\n'.join(sentences) + '\n'
+
+def write_progress(done, total):
+	# should look like this:
+	# [====================>          ] 67%
+	p = int(done / total * progress_width) if total > 0 else progress_width
+	percent = int(100 * done / total) if total > 0 else 100
+	sys.stdout.write('\r[' + '='*p + '>' + ' '*(progress_width-p) + '] {}%'.format(percent))
+	sys.stdout.flush()
+
+# extracts the sentences from the subtitles of every video in `video_ids`, and writes them to
+# `output_file` in the same order, with `num_workers` processes (by default, the number of CPUs).
+# Each worker is given `chunksize` videos at a time.
+def run(video_ids, output_file, num_workers=None, chunksize=4, debug=False):
+	# the lexicon is only read once, and then given to each worker
+	lexicon = load_lexicon()
+
+	with open(output_file, 'w', buffering=write_buffer_size) as f:
+		with multiprocessing.Pool(num_workers, initializer=init_worker, initargs=(lexicon,)) as pool:
+			for i, (video_id, sentences) in enumerate(zip(video_ids, pool.imap(do_video, video_ids, chunksize))):
+				write_progress(i, len(video_ids))
+
+				if sentences is not None:
+					f.write(format_sentences(video_id, sentences, debug))
+
+	# print the progress bar as complete
+	print("\r[{}>] 100%".format('='*progress_width))
@@ -17,10 +17,6 @@ ext = 'en.vtt'
 # and (2) to indicate the start of a new sentence
 subtitle_max_gap_time = 0.3
 
-# the required portion of subitles that need to have overlap in order to
-# consider it a part of the formatting for the video
-subtitle_min_fraction = 0.5
-
 # These two constants dictate the minimum and maximum lengths of
 # sentences we'll allow with our cleaning script
 lower_bound = 3
@@ -0,0 +1,1029 @@
+# Turns the subtitles for a video (in WebVTT format) into a list of sentences.
+#
+# `SentenceExtractor.extract` does the whole thing for the text of one subtitle file. Every regular
+# expression used along the way is compiled once, when this module is imported, rather than every
+# time it's used. The extractor itself only holds the lexicon, so it can be made once and reused
+# for any number of videos (see 'extraction_engine.py').
+
+import io
+import re
+import sys
+import html
+import unicodedata
+
+import numpy as np
+
+import gen_consts as gconsts
+
+# import 'sentence_consts' from .. as 'sconsts'
+from os.path import abspath, join, dirname
+sys.path.append(abspath(join(dirname(abspath(__file__)), '..')))
+import sentence_consts as sconsts
+
+__all__ = ['SentenceExtractor', 'TextGroup', 'GroupTable', 'RollingText', 'parse_groups', 'preprocess_groups', 'load_lexicon']
+
+# ***********************************************************
+# NOTES ON FORMATTING
+# ***********************************************************
+
+# all subtitles start with the following:
+"""
+WEBVTT
+Kind: captions
+Language: en
+"""
+# The rest of the file then looks like this:
+"""
+00:00:27.760 --> 00:00:30.129
+Trump's presidency
+is like one of his handshakes.
+
+00:00:30.229 --> 00:00:33.032
+It pulls you in,
+whether you like it or not.
+
+00:00:33.833 --> 00:00:36.402
+He's had so many
+terrible moments this year,
+
+00:00:36.502 --> 00:00:38.137
+you probably forgot about
+many of them.
+"""
+# Taken from videoID: '1ZAPwfrtAFY'
+#
+# There are a few other formatting points:
+# * Subititles support html formatting (e.g. <i>foo</i>)
+#   * As such, some html characters are escaped. The most common ones
+#     are '&lt;' and '&gt;'
+# * ALL SUBTITLES END WITH TWO BLANK LINES. This is an important detail
+# * Styles differ across channels and videos, so here's a list of edge
+#   cases that must be accounted for:
+#   * Escaped phrases or descriptions, e.g. [Laughter]
+#   * Rolling text -- each block contains overlap with the previous to
+#     give the impression of text rolling up the screen
+#   * Additional formatting on the first line of the blocks, such as:
+#       00:00:03.536 --> 00:00:04.303 align:start position:0%
+#   * (Mostly) Empty lines within blocks (we can't just split by '\n\n')
+#     * They won't be completely empty, as far as I can tell: they all
+#       have -- at the very least -- spaces on those lines
+#   * '>>' to denote a change in speaker
+#   * '$Name: Text' or '($Name) Text' to denote who's talking
+#     * Note: These two will sometimes be used in combination, but only
+#       use a named switch for certain people, not others. For an
+#       example, see this videoID: W7SZmMW6Ow0
+#   * 'Cues', which prefix blocks with a number, starting at 1 and
+#     counting up. Example:
+"""
+        WEBVTT
+        Kind: captions
+        Language: en
+
+        1
+        00:00:00.000 --> 00:00:05.580
+        [MUSIC]
+
+        2
+        00:00:05.580 --> 00:00:06.396
+        That's not his briefcase.
+"""
+#   * All-caps (sometimes even while $Name is normally cased)
+# ***********************************************************
+
+def parse_time(t):
+    # returns the number of milliseconds given by a time formatted like
+    # '00:00:05.580'. The digits are always in the same places, so we
+    # can just slice them out.
+    return int(t[0:2])*3600000 + int(t[3:5])*60000 + int(t[6:8])*1000 + int(t[9:12])
+
+class TextGroup():
+    # there are a lot of these, so we don't give them a `__dict__`
+    __slots__ = ('lines', 'start_ms', 'end_ms')
+
+    # `start_ms` and `end_ms` are the times of the group, in milliseconds
+    def __init__(self, lines, start_ms, end_ms):
+        self.lines = lines
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    def from_text(time_header, body):
+        return TextGroup.from_lines(time_header, body.split('\n'))
+
+    def from_lines(time_header, lines):
+        # Get the time from the header. The header is guaranteed to be
+        # formatted like:
+        #   00:00:00.000 --> 00:00:05.580
+        # even though they may be formatted differently in the raw text
+        # of the subtitles themselves:
+        #   00:00:03.536 --> 00:00:04.303 align:start position:0%
+
+        start_ms = parse_time(time_header[0:12])
+        end_ms = parse_time(time_header[17:29])
+
+        lines = [replace_html_escaped_chars(l) for l in lines]
+
+        return TextGroup(lines, start_ms, end_ms)
+
+    def time_diff(a, b):
+        # returns the amount of time, in seconds, between the end of `a`
+        # and the start of `b`, as a float.
+        
+        return (b.start_ms - a.end_ms) / 1000
+
+    def join(a, b, merge_overlap=True):
+        # combines `a` and `b` into one `TextGroup`.
+        #
+        # if merge_overlap is True (default), then it we'll treat the
+        # overlapped region as expected -- it'll only appear once.
+        #
+        # NOTE: This does not take into account the time difference
+        # between the two groups
+
+        new_lines = []
+
+        if merge_overlap:
+            def non_empty_line(l):
+                return blank_line_pattern.match(l) is None
+
+            b.lines = list(filter(non_empty_line, b.lines))
+
+            new_lines = a.lines + b.lines[TextGroup.overlap(a, b):]
+        else:
+            new_lines = a.lines + b.lines
+
+        return TextGroup(new_lines, a.start_ms, b.end_ms)
+
+    def overlap(a, b):
+        # gives the number of lines that overlap between the two groups,
+        # where `b` starts with the end of `a`
+        #
+        # I have only ever seen this done with Jimmy Kimmel's videos,
+        # but he has reached the trending page an unfortunate number of
+        # times.
+        #
+        # Here's an example videoID to take a look: eIp7PYuAu0k
+
+        return overlap_size(a.lines, b.lines)
+
+    def overlaps(a, b):
+        # Returns whether or not the two groups have any overlap,
+        # irrespective of the time difference between them
+
+        return TextGroup.overlap(a, b) != 0
+
+def overlap_size(a, b, first_index=None):
+    # `TextGroup.overlap` for two lists of lines (or of line ids). If
+    # given, `first_index` maps each line in `a` to the index where it
+    # first appears, so that `a` doesn't need to be searched.
+
+    if len(a) == 0 or len(b) == 0:
+        return 0
+
+    # the starting line of the overlap: the first place that `a`
+    # contains the starting line of `b`
+    if first_index is not None:
+        start_index = first_index.get(b[0])
+    else:
+        start_index = a.index(b[0]) if b[0] in a else None
+
+    if start_index is None:
+        return 0
+
+    # verify that the rest of the lines are the same. Note that the
+    # rest of `a` is lined up with `b` from its *first* line (not its
+    # second), so this only finds an overlap of one line, or of a line
+    # that repeats. That's how the sentences have always been made, so
+    # it's kept this way.
+    n = min(len(a) - start_index - 1, len(b))
+    if a[start_index+1:start_index+1+n] != b[:n]:
+        return 0
+
+    return n + 1
+
+class GroupTable():
+    # The times of a list of `TextGroup`s, as arrays, so that the gaps
+    # between all of them can be found at once.
+    #
+    # Each distinct line is also given an id, so that the lines of the
+    # groups can be compared as integers when they're merged by
+    # `RollingText`. This (and whether the line is blank) is only worked
+    # out once per line.
+    def __init__(self, groups):
+        self.groups = groups
+        self.start_ms = np.fromiter((g.start_ms for g in groups), dtype=np.int64, count=len(groups))
+        self.end_ms = np.fromiter((g.end_ms for g in groups), dtype=np.int64, count=len(groups))
+
+        # `blank[i]` is whether the line with id `i` is blank
+        line_ids = {}
+        self.blank = []
+        self.line_ids = []
+        for g in groups:
+            ids = []
+            for l in g.lines:
+                i = line_ids.get(l)
+                if i is None:
+                    i = len(line_ids)
+                    line_ids[l] = i
+                    self.blank.append(blank_line_pattern.match(l) is not None)
+                ids.append(i)
+
+            self.line_ids.append(ids)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def gaps(self):
+        # returns the amount of time, in seconds, between the end of
+        # each group and the start of the next -- i.e. `gaps()[i]` is
+        # the same as `TextGroup.time_diff(groups[i], groups[i+1])`
+        return (self.start_ms[1:] - self.end_ms[:-1]) / 1000
+
+class RollingText():
+    # Builds up a time group from consecutive groups in a `GroupTable`,
+    # where the lines that each group shares with the text so far are
+    # only included once. This gives the same result as joining the
+    # groups one after the other with `TextGroup.join`, but the lines
+    # are only compared by their ids, and the place where each line
+    # first appears is kept track of as we go.
+    def __init__(self, table, i):
+        self.table = table
+
+        g = table.groups[i]
+        self.lines = list(g.lines)
+        self.ids = list(table.line_ids[i])
+        self.start_ms = g.start_ms
+        self.end_ms = g.end_ms
+
+        self.first_index = {}
+        for j, line_id in enumerate(self.ids):
+            self.first_index.setdefault(line_id, j)
+
+    def add(self, i):
+        # adds the group at index `i` to the end of the text
+        table = self.table
+        g = table.groups[i]
+
+        # blank lines are left out of the new group
+        keep = [j for j, line_id in enumerate(table.line_ids[i]) if not table.blank[line_id]]
+        ids = [table.line_ids[i][j] for j in keep]
+
+        n = overlap_size(self.ids, ids, self.first_index)
+
+        for j, line_id in enumerate(ids[n:], len(self.ids)):
+            self.first_index.setdefault(line_id, j)
+
+        self.ids.extend(ids[n:])
+        self.lines.extend(g.lines[j] for j in keep[n:])
+        self.end_ms = g.end_ms
+
+    def group(self):
+        return TextGroup(self.lines, self.start_ms, self.end_ms)
+
+# The header of the file is followed by blocks that look like:
+#   00:00:27.760 --> 00:00:30.129
+#   Trump's presidency
+#   is like one of his handshakes.
+#
+# We'd like to be able to split by '\n\n', but ONE subtitle doesn't
+# adhere to this format. SO, we'll use a solution that doesn't rely on
+# a usually-adhered-to style for writing the subtitles, and instead use
+# the specification of the format itself: a block starts with a line
+# that begins with its time range, and runs until the next one.
+time_fmt = r"[0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{3}"
+time_line_pattern = re.compile(r"({} --> {})".format(time_fmt, time_fmt))
+
+def parse_groups(vtt_lines):
+    # yields a `TextGroup` for each block in a subtitle file, given as
+    # an iterable of its lines (e.g. the open file). Each line is only
+    # looked at once, so this takes linear time, and only one block is
+    # held in memory at a time.
+    #
+    # The first block is the header, which looks something like this:
+    """
+    WEBVTT
+    Kind: captions
+    Language: en
+    """
+    # So we don't include the first block.
+    #
+    # The details follow what was previously done with a regex over the
+    # whole file:
+    #  * a time line needs a newline after it, and it can't be the first
+    #    line of the file
+    #  * after the first block, a new block only starts at a time line
+    #    that comes after a blank line, or after a blank line and a line
+    #    that's only a number (the cue, which isn't part of either block).
+    #    Any other time line is part of the body.
+    #  * the blank line is kept at the end of the body
+    #  * the body of the last block runs to the end of the file, except
+    #    for a final blank line
+
+    time_header = None
+    body = []
+    terminated = False
+
+    for i, line in enumerate(vtt_lines):
+        terminated = line.endswith('\n')
+        if terminated:
+            line = line[:-1]
+
+        match = time_line_pattern.match(line) if terminated and i > 0 else None
+
+        if match is None:
+            if time_header is not None:
+                body.append(line)
+            continue
+
+        if time_header is None:
+            time_header = match.group(1)
+        elif len(body) >= 2 and body[-2] == '' and body[-1].isdecimal():
+            yield TextGroup.from_lines(time_header, body[:-1])
+            time_header = match.group(1)
+            body = []
+        elif len(body) >= 1 and body[-1] == '':
+            yield TextGroup.from_lines(time_header, body)
+            time_header = match.group(1)
+            body = []
+        else:
+            body.append(line)
+
+    if time_header is not None:
+        if terminated and len(body) > 0 and body[-1] != '':
+            body.append('')
+        yield TextGroup.from_lines(time_header, body if len(body) > 0 else [''])
+
+html_tag_pattern = re.compile(r"<.+?>")
+html_close_tag_pattern = re.compile(r"</.+?>")
+
+def replace_html_escaped_chars(s):
+    # remove html tags
+    s = html_tag_pattern.sub("", s)
+    s = html_close_tag_pattern.sub("", s)
+
+    # Replace the various escaped characters
+    return html.unescape(s)
+
+def preprocess_groups(groups):
+    # Takes a list of `TextGroup`s and does a few key things:
+    # * If the subtitles are formatted to have overlaps
+    #   (see list above), groups that overlap are combined
+    # * Returns a list of time groups. We're defining time groups as
+    #   sets of sequential subtitle groups that have are effectively
+    #   continuous, i.e. there is no gap greater than the maximum gap
+    #   time, as defined in 'gen_consts.py'
+    #   * The list that is returned is a list of lists of lines, where
+    #     we have concatenated the lists of lines within the indiviual
+    #     subtitle groups into one time group.
+    #
+    # `groups` can be a list of `TextGroup`s or a `GroupTable`.
+
+    table = groups if isinstance(groups, GroupTable) else GroupTable(groups)
+    groups = table.groups
+
+    if len(groups) == 0:
+        return []
+
+    # Distinct groupings, determined by the amount of time between
+    # groups. Any gap greater than `gconsts.subtitle_max_gap_time` will
+    # be used to indicate a different time group. A time group ends
+    # when its last subtitle group does, so these are just the gaps
+    # between consecutive subtitle groups.
+    firsts = [0] + (np.flatnonzero(table.gaps() > gconsts.subtitle_max_gap_time) + 1).tolist()
+    ends = firsts[1:] + [len(groups)]
+
+    time_groups = []
+    for first, end in zip(firsts, ends):
+        if end - first == 1:
+            time_groups.append(groups[first])
+            continue
+
+        text = RollingText(table, first)
+        for i in range(first + 1, end):
+            text.add(i)
+
+        time_groups.append(text.group())
+
+    return time_groups
+
+# ***********************************************************
+# PATTERNS
+# ***********************************************************
+#
+# These are all of the patterns used by `SentenceExtractor`, in the
+# order that they're used. See the methods below for what each one is
+# for.
+
+blank_line_pattern = re.compile(r"^\s*$")
+
+# for `format_line`
+whitespace_pattern = re.compile(r"\s+")
+# left side is en dash, right side is em dash
+dash_pattern = re.compile(r"(–|—)")
+# This pattern is heavily inspired by the one found at
+# https://stackoverflow.com/a/3809435
+# This one isn't perfect, and needed to be modified slightly to
+# avoid matching on acronyms, but it should be good.
+url_pattern = re.compile(r"([-a-zA-Z0-9]+:(//)?)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{2,6}\b([-a-zA-Z0-9()@:%_+.~#?&/=]*)")
+percent_pattern = re.compile(r"(?<=\d)%")
+keep_in = r"a-zA-Z0-9.\'\"\-,;:?!()\[\]*'\" "
+unsupported_chars_pattern = re.compile("[^{}]+".format(keep_in))
+between_urls_pattern = re.compile(r"(^|<url(?:-\d+)?>)(.*?)($|(?=<url(-\d+)?>))")
+parenthetical = r"(\([^\)]*\)|\[[^\]]*\])"
+name = r"[A-Z]([-a-z]+((\. ?| )[A-Z][-a-z]*)*|[-A-Z]+((\. ?| )[-a-z]+)*)?"
+speaker_pattern = re.compile(r"^( ?(<char>|-))? ?{}( {})?: ".format(name, parenthetical))
+#                               \-------------/ / \----/
+#                                   spacing     |    \--parentheticals
+#                                              name
+collapse_tags_pattern = re.compile(r"(<[^>]*>) (?=<[^>]*>)")
+
+# for `to_sentences`
+paren_pattern = re.compile(r"\([^\)]*?\)")
+bracket_pattern = re.compile(r"\[[^\]]*?\]")
+asterisk_pattern = re.compile(r"(\*+)[^*]*?\1")
+dquote_pattern = re.compile(r"\"([^\"]*?)\"")
+squote_pattern = re.compile(r"(?<=\s)__'([^']*?)'__(?![A-Za-z])")
+# `amb` for ambiguous -- certain words that are able to have periods
+# after them in normal sentences.
+amb = ['Mr', 'Ms', 'Mrs', 'St', 'Dr', 'Prof', 'Capt', 'Lt',
+       'Mt', 'Inc', 'Ltd', 'Co', 'Jr', 'Sr', 'Gov', 'Esq',
+       'Hon', 'Rev']
+# we include '>' before in case of some other tag before it
+amb_pattern = re.compile(r"(?<=[\s^>])({})\.".format("|".join(amb)), re.IGNORECASE)
+phd_pattern = re.compile(r"(?<=[\s^])Ph\.D\.")
+versus_pattern = re.compile(r"(?<=[\s^])(vs?)\.", re.IGNORECASE)
+acronym_pattern = re.compile(r"([A-Z]\.){2,}")
+ellipsis_pattern = re.compile(r"\.{3,}")
+before_dots_pattern = re.compile(r"(?<=[\s^])(?=<dots>)")
+after_dots_pattern = re.compile(r"(?<=<dots>)(?=[\s<$])")
+decimal_pattern = re.compile(r"\d+\.\d+")
+number_comma_pattern = re.compile(r"(?<=[\s^])\d+(, ?\d+)+")
+dash_before_pattern = re.compile(r"(\s)-")
+dash_after_pattern = re.compile(r"-(\s)")
+quote_end_stop_pattern = re.compile(r"([.!?])(</(?:s|d)quote>)")
+stop_pattern = re.compile(r"([.!?])(?=[\s<$])")
+quote_end_discard_pattern = re.compile(r"(?<![,.!?])(</(?:s|d)quote>)")
+quote_start_discard_pattern = re.compile(r"(?<!<stop>)(\s+<(?:s|d)quote>)")
+line_end_maybe_pattern = re.compile(r"(<char>|<url(?:-\d+)>)(?=\n)")
+comma_pattern = re.compile(r",")
+repeated_maybe_pattern = re.compile(r"(<maybe>\s?){2,}")
+starting_speaker_pattern = re.compile(r"^(<[^>]*>\s?)*<speaker>")
+continued_pattern = re.compile(r"<continue>(<[^>]*>\s?)*$")
+# Rule 5 - we'll attempt to match the entire string
+tag = r"(?:<[^>]*>\s?)"
+other_tag = r"(?:<(?!url(?:-\d+)?|char)[^>]+>\s?)"
+word = r"(?:[\w,.;:!?]+\s?)"
+url_or_char = r"(?:<url(?:-\d+)?>|<char>)"
+start = r"(?=({}*))\2{}\s?(?=((?:{}|{})*))\3".format(tag, word, word, other_tag)
+end = r"(?=({}*))\5{}\s?(?=((?:{}|{})*))\6".format(tag, word, word, tag)
+url_or_char_between_words_pattern = re.compile(r"^({}{})(\s?{})$".format(start, url_or_char, end))
+# Rule 6 (ending)
+url_or_char_ending_pattern = re.compile(r"^(<url(-\d+)?>|<char>)\s?(<[^>]*>\s?)*$")
+# Rule 6 (starting) and 7
+boundary_start_pattern = re.compile(r"^(<[^>]*>\s?)*" +\
+                                    r"<(url(-\d+)?|char|paren|bracket|asterisk)>")
+# the first word, so long as it starts with a capital letter. The word
+# will be the first match group.
+capital_word_pattern = re.compile(r"^(?:<[^>]*>\s?)*" +\
+                                  r"([A-Z][a-zA-Z]*)")
+quote_tag_pattern = re.compile(r"</?squote>")
+dquote_tag_pattern = re.compile(r"</?dquote>")
+url_tag_pattern = re.compile(r"<url(-\d+)?>")
+
+# for `filter_sentences`
+word_char_pattern = re.compile(r"\w")
+
+# for `ensure_lowercase`
+edge_pattern = re.compile(r"(^[ \-]+|[ \-]+$)")
+letters_pattern = re.compile(r"[a-zA-Z]+")
+lowercase_pattern = re.compile(r"[a-z]")
+# We need to allow "'" because of contractions. Our minimum length is to
+# filter out acronyms.
+uppercase_word_pattern = re.compile(r"[A-Z']{2,}")
+standalone_a_pattern = re.compile(r"((?<=^)|(?<= ))A(?=[ ,;:?!]|\.$)")
+first_letter_pattern = re.compile(r"^[a-z]")
+
+def load_lexicon():
+    with open(sconsts.lexicon_file) as f:
+        return set(f.read().split('\n'))
+
+class SentenceExtractor():
+    # `lexicon` is a set of words, used to decide where sentences start
+    # and how to fix their case. If not given, it's loaded from
+    # 'Sentences/Lexicon/lexicon.txt'.
+    def __init__(self, lexicon=None):
+        self.lexicon = lexicon if lexicon is not None else load_lexicon()
+
+    def extract(self, vtt_text):
+        # returns the list of sentences from the subtitles given by
+        # `vtt_text`, the contents of a '.vtt' file
+        return self.extract_lines(io.StringIO(vtt_text))
+
+    def extract_lines(self, vtt_lines):
+        # the same as `extract`, but for an iterable of the lines in the
+        # file -- e.g. the open file itself
+        groups = preprocess_groups(list(parse_groups(vtt_lines)))
+
+        sentences = self.to_sentences(groups)
+        sentences = self.filter_sentences(sentences)
+        return [self.ensure_lowercase(s) for s in sentences]
+
+    def format_line(self, line, urls=None):
+        # Formats a line for use in to_sentences()
+        #
+        # This function only exists to separate certain parts of
+        # `to_sentences()`, so many pieces of this function only make sense
+        # when understood within the context of the other.
+        #
+        # <speaker> will always indicate a new speaker (but will not catch
+        # all of them)
+        #
+        # <char> indicates a character that is outside of our character set
+        #
+        # PLEASE NOTE: Quotations are not removed -- that will be done later
+        # because they often cross lines.
+
+        # Do a couple standardizing things -- both with whitespace and
+        # dashes. All whitespace is converted to a single space, and all
+        # dash-like characters are converted to '-'
+        l = whitespace_pattern.sub(" ", line)
+        # left side is en dash, right side is em dash
+        l = dash_pattern.sub("-", l)
+
+        # remove accents -- borrowed from a stackoverflow post:
+        # https://stackoverflow.com/a/31607735
+        # l = unicode(l)
+        l = unicodedata.normalize('NFD', l)
+        l = l.encode('ascii', 'ignore')
+        l = l.decode('utf-8')
+
+        # Remove and store any urls.
+        def replace_url(match):
+            if urls is None:
+                return "<url>"
+            else:
+                # group 0 is the entire string
+                index = len(urls)
+                urls.append(match.group(0))
+                return "<url-{}>".format(index)
+        l = url_pattern.sub(replace_url, l)
+
+        # We'll do a small thing here that should aid in readability.
+        # Because percentages often follow a predictable format, we'll
+        # replace them with 'percent'
+        l = percent_pattern.sub(" percent", l)
+
+        # Remove all characters that won't:
+        #   A: Be a part of the final sentence, or
+        #   B: Help inform sentence boundaries
+        # We'll replace those charactrs with '<char>' to indicate that there
+        # was an unsupported character in its place.
+        #
+        # Two characters we specifically NEED to remove are open and close
+        # angle brackets ('<', '>'), because we use them in tags. We've
+        # already made one tag with them -- '<url>', so we want to replace
+        # unsupported characters EXCEPT where they are being used as part of
+        # '<url>'.
+        #
+        # The regex pattern we're using is more complicated than I'd like,
+        # but it seems to be the best solution (others require more helper
+        # functions). URL tags are not fixed width -- it may also be of the
+        # form '<url-$N>', where $N is an unbounded non-negative integer.
+        # Because of this, we can't use a lookbehind assertion to only match
+        # the text in-between, so we include url tags at the start of our
+        # match. The replacement of characters then operates on the second
+        # match group, while we preserve the first. The rest of the regex
+        # should be *fairly* self-explanatory. 
+        def repl_chars(match):
+            return match.group(1) + unsupported_chars_pattern.sub("<char>", match.group(2))
+        #
+        l = between_urls_pattern.sub(repl_chars, l)
+
+        # Remove some speaker annotations. There's a few different ways this
+        # is done that we need to take care of here (others will be
+        # inadvertently taken care of later)
+        #
+        # What are speaker annotations? It's a term I made up (although that
+        # may be what it's actually called). It refers to the times in a
+        # subtitle in which a change in who's speaking labels them by name.
+        # There are a few different ways this is done. Here are some
+        # examples, in the time blocks that they originally were in:
+        """
+        00:00:52.052 --> 00:00:58.391 align:start size:88% position:13%
+        &gt;&gt; Stephen: GOOD TO SEE YOU
+        TOO.
+        *********************
+        00:00:14.530 --> 00:00:16.460
+        (Garrett) There's no way that's correct!
+        *********************
+        00:00:00.100 --> 00:00:02.040
+        STEVE (VO): Obviously, I love James.
+    
+        <...>
+
+        00:02:10.020 --> 00:02:11.960
+        DR. PLIER: For it was camouflage.
+        *********************
+        00:00:08.000 --> 00:00:10.000
+        G: Hi guys, I'm here with my mom! T: Hey!
+        *********************
+        00:00:02.250 --> 00:00:03.203
+        - [Group Member] Hey, puppy!
+
+        <...>
+
+        00:00:18.480 --> 00:00:20.477
+        - Hi, BuzzFeed, we're BTS with--
+
+        00:00:20.650 --> 00:00:22.490
+        - Hi, BTS!
+        - PPS, the puppies.
+        """
+        # Videos (in order): 2GrKY7Qqal8, -RmUADCWI4A, 0I9vWjc9nao,
+        # 0PW9MWDWLH8, 1PhPYr_9zRY
+        #
+        # Some of these (like the second-to-last exmaple) cannot be done
+        # yet, as they require other knowledge about sentence boundaries to
+        # remove.
+        #
+        # For those that don't, however, we CAN get rid of them. We'll
+        # ingore speakers switching mid-line for now, and just focus on
+        # when it starts the line
+
+        l = speaker_pattern.sub("<speaker>", l)
+
+        # collapse tags
+        l = collapse_tags_pattern.sub(r"\1", l)
+
+        return l
+
+    def to_sentences(self, time_groups):
+        # Picks out sentences from the lines
+    
+        lines = [[self.format_line(l) for l in group.lines] for group in time_groups]
+
+        # `format_line` contains plenty of information as to what formatting
+        # has been done to the lines at this point. Notably, a couple
+        # characters and sequences have been replaced with '<...>'. The
+        # first part of this establishes the rest of that
+        #
+        # We'll apply the same process for every group
+
+        all_sentences = []
+
+        for g in lines:
+            # add the lines back together so that we can deal with one
+            # coherent string
+            s = '\n'.join(g)
+
+            # Remove various parenthetical statements: '(foo)', '[foo]', and
+            # *foo* (or **foo**). These typically are used to convey
+            # information other than what's being said - which is what we
+            # care about.
+            #
+            # Additionally (as mentioned above, in `format_line()`)
+            # parenthesis can also denote a new speaker, so we'll note that
+            # as well
+            s = paren_pattern.sub("<paren>", s)
+            s = bracket_pattern.sub("<bracket>", s)
+            s = asterisk_pattern.sub("<asterisk>", s)
+
+            # Instead of removing the inside of quotes, we'll just mark
+            # them. Double quotes are easy, because they don't get used in
+            # any other circumstance than as quotation, but single quotes
+            # use the same character as apostrophes, so it needs to be
+            # marginally more complicated.
+            s = dquote_pattern.sub(r"<dquote>\1</dquote>", s)
+            s = squote_pattern.sub(r"<squote>\1</squote>", s)
+
+            # ************************************************************
+            # The next thing that we need to do is heavily inspired from a
+            # certain stackoverflow answer about how to split a text into
+            # sentences. We're essentially using it as a way to keep track
+            # of all of the special cases that we get in the English
+            # language.
+            #
+            # Answer: https://stackoverflow.com/a/31505798
+            #
+            # we'll be using '<prd>' to mark periods while we temporarily
+            # take them out
+
+            # mark certain words that are able to have periods after them in
+            # normal sentences.
+            # (see `amb`)
+            s = amb_pattern.sub(r"\1<prd><maybe>", s)
+
+            # PhD is a special case:
+            s = phd_pattern.sub(r"Ph<prd>D<prd><maybe>", s)
+
+            # Another special case is 'Vs.' or 'v.' in both lower and upper
+            # case, which we know should not end a sentence
+            #
+            # This often occurs when talking about competitions or court
+            # cases.
+            s = versus_pattern.sub(r"\1<prd>", s)
+
+            replace_prd = lambda match: match.group(0).replace('.', '<prd>')
+
+            # Deal with acronyms
+            replace_prd_acronym = lambda match: replace_prd(match) + '<maybe>'
+            #
+            s = acronym_pattern.sub(replace_prd_acronym, s)
+    
+            # Handle ellipsis
+            s = ellipsis_pattern.sub(r"<dots>", s)
+            s = before_dots_pattern.sub("<maybe>", s)
+            s = after_dots_pattern.sub("<maybe>", s)
+        
+            # Handle numbers
+            s = decimal_pattern.sub(replace_prd, s)
+            # Handling commas covers both European '5,6' (= 5.6) and
+            # '2,019'
+            replace_comma = lambda match: match.group(0).replace(',', '<comma>')
+            #
+            s = number_comma_pattern.sub(replace_comma, s)
+
+            # Handle dashes (we've converted all types of dashes to '-').
+            # Dashes used as punctuation will have a space bfore or after
+            s = dash_before_pattern.sub(r"\1<maybe><dash>", s)
+            s = dash_after_pattern.sub(r"<dash><maybe>\1", s)
+
+
+            # LAST STEP:
+            #
+            # Handle punctuation and use periods to mark sentence boundaries
+            s = quote_end_stop_pattern.sub(r"\1<stop>\2<maybe>", s)
+            s = stop_pattern.sub(r"\1<stop>", s)
+            # NOTE : We're discarding everything in the quotes because we're
+            # not sure that it's a complete sentence
+            s = quote_end_discard_pattern.sub(r"<discard>\1<maybe>", s)
+
+            # Another bit about quotes:
+            # If the part of the sentence before the start of the quote
+            # doesn't properly end, then we need to mark it for being
+            # discarded.
+            #
+            # We're defining a lack of proper ending as not having
+            # punctuation that would indicate such an ending.
+            s = quote_start_discard_pattern.sub(r"<discard>\1", s)
+
+            # Mark cases of URLs and unknown characters at the end of the
+            # line with '<maybe>', because they might be used to terminate
+            # the sentence
+            s = line_end_maybe_pattern.sub(r"\1<maybe>", s)
+
+            # Commas imply that there's more to the sentence, so we'll use
+            # '<continue>' to indicate that.
+            s = comma_pattern.sub(r",<continue>", s)
+
+            # make sure we don't get repeats of '<maybe>'
+            s = repeated_maybe_pattern.sub('<maybe>', s)
+
+            # ************************************************************
+            # USE THE MARKERS TO SPLIT INTO SENTENCES
+            # ************************************************************
+            s = s.replace('<stop>', '<maybe><new>')
+            s = repeated_maybe_pattern.sub('<maybe>', s)
+            temp = [m.strip() for m in s.split('<maybe>')]
+
+            s = ""
+            last_fragment = None
+            def shift_new_sentence(sentence):
+                nonlocal s, last_fragment
+
+                if last_fragment is not None:
+                    s += last_fragment + '<stop>'
+                last_fragment = sentence
+                return
+
+            # m = current segment
+            # p = previous
+            for m, p in zip(temp, [""]+temp):
+                # For each sentence block indicated by '<maybe>', we'll
+                # attempt to determine whether or not it is a new sentence
+                # or a part of the previous.
+                #
+                # This part is complicated.
+                #
+                # For reference, here's a list of all of the tags are
+                # currently in use
+                # * url | url-$N
+                # * char
+                # * continue
+                # * speaker
+                #     -- only at the beginning of a line
+                # * discard
+                # * paren | bracket | asterisk
+                # * dquote | /dquote
+                #     -- open and close like html tags 
+                # * squote | /squote
+                #     -- open and close like html tags
+                # * maybe
+                # * new
+                # * comma
+                # * prd
+                # * dash
+                # * dots
+                # Note that the following tags have already been replaced:
+                # * stop
+                #
+                # Rules that we're going to apply, in order of preference:
+                # 1. <new> - if present - will be at the start of the string
+                #    and will indicate the start of a new sentence
+                # 2. <continue> at a sentence boundary should guarantee that
+                #    the current sentence fragment will be added to the last
+                # 3. <speaker> indicates the start of a new sentence
+                # 4. If (1) and (2) conflicts with (3), the sentence will be
+                #    joined with the last fragment and marked for being
+                #    discarded.
+                # 5. Sentences with <char> or <url> between words should be
+                #    discarded
+                # 6. However: <url> or <char>, if at the start or the end,
+                #    will indicate a sentence boundary. 
+                # 7. <paren>|<bracket>|<asterisk> are ignored if in the
+                #    middle or end and used as a sentence boundary if at
+                #    the start.
+                # 8. <discard> will be done after the sentence has been
+                #    completed and indicates that it should be thrown out
+                # 9. All other escaped tags are ignored because they have
+                #    already been taken into consideration.
+
+                # Rule 1
+                isNewSentence = m.startswith('<new>')
+
+                # Rule 2
+                if not isNewSentence:
+                    # Check for '<speaker>' in the starting tags
+                    if starting_speaker_pattern.match(m) is not None:
+                        isNewSentence = True
+
+                # Rule 3
+                continued = continued_pattern.match(p) is not None
+
+                # Rule 4
+                bypass_add_later = False
+                if continued and isNewSentence:
+                    m = '<discard>' + m
+                    isNewSentence = False
+                    bypass_add_later = True
+
+                # Rule 5 - we'll attempt to match the entire string
+                m = url_or_char_between_words_pattern.sub(r"\1<discard>\4", m)
+
+                # follow through with rules 1 and 2
+                if isNewSentence:
+                    shift_new_sentence(m)
+                    continue
+
+                # Rule 6 (ending)
+                if url_or_char_ending_pattern.match(p) is not None:
+                    shift_new_sentence(m)
+                    continue
+
+                # Rule 6 (starting) and 7
+                if boundary_start_pattern.match(m) is not None:
+                    shift_new_sentence(m)
+                    continue
+
+                # Now, it's just up to whether or not the fragment is the
+                # start of a new sentence
+                #
+                # We'll only indicate that it's the start of a new sentence
+                # if these conditions are met:
+                #  (1) the fragment starts with a word that starts with an
+                #      uppercase letter
+                #  (2) the word appears in the lexicon as lowercase but not
+                #      uppercase
+                #
+                # Find the first word, so long as it starts with a capital
+                # letter.
+                match = capital_word_pattern.match(m)
+                if match is not None and not bypass_add_later:
+                    word = match.group(1)
+
+                    lower_in = word.lower() in self.lexicon
+                    upper_in = (word in self.lexicon or
+                                (word[0] + word[1].lower()) in self.lexicon if len(word) > 1 else False)
+
+                    if lower_in and not upper_in:
+                        isNewSentence = True
+
+                if isNewSentence:
+                    shift_new_sentence(m)
+                else:
+                    if last_fragment is None:
+                        last_fragment = m
+                    else:
+                        last_fragment += " " + m
+
+            if last_fragment is not None:
+                s += last_fragment
+
+            # Now that we've done essentially everything we needed to, we'll
+            # start putting things back
+            #
+            # Every single tag is handled here.
+            s = s.replace('<comma>', ',').replace('<prd>', '.')
+            s = s.replace('<dash>', '-').replace('<dots>', '...')
+        
+            # We actually want to remove quotes, because we don't support
+            # typing quotes
+            s = quote_tag_pattern.sub("", s)
+            s = dquote_tag_pattern.sub('', s)
+
+            s = s.replace('<paren>', "").replace('<bracket>', "")
+            s = s.replace('<asterisk>', "")
+
+            # Remove helper control flow tags
+            s = s.replace('<new>', "").replace('<continue>', "")
+            s = s.replace('<speaker>', "")
+
+            # For this case, we're removing URLs. Alternatively, we could
+            # choose to save them
+            s = url_tag_pattern.sub("", s)
+
+            # We're also going to remove unrecognized characters
+            s = s.replace('<char>', "")
+
+            sentences = s.split('<stop>')
+
+            # standardize whitespace
+            sentences = [whitespace_pattern.sub(r" ", s.strip()) for s in sentences]
+
+            # discard all sentences marked for being discarded
+            sentences = list(filter(lambda s: '<discard>' not in s, sentences))
+
+            all_sentences.extend(sentences)
+
+        return all_sentences
+
+    def filter_sentences(self, sentences):
+        def is_good(s):
+            return word_char_pattern.match(s) is not None
+
+        return list(filter(is_good, sentences))
+
+    def ensure_lowercase(self, sentence):
+        # If the given sentence is all uppercase, it converts it to
+        # normal case, and if it is lowercase, it is left as is. There are
+        # limitations to this, but this is a best attempt. A possible change
+        # could be to put sentences that are only uppercase into a different
+        # pool for later, as the casing may not be accurate.
+        #
+        # This will also remove any excess whitespace or certain punctuation
+        # from the beginning and end of the sentence
+
+        sentence = edge_pattern.sub("", sentence)
+
+        # We'll essentially find all distinct words and if there is at least
+        # one lowercase word, we'll say that the sentence is already in
+        # lowercase.
+        #
+        # Note: Because we substitute '%' for 'percent' (lowercase) in
+        # `format_line()`, we can't count 'percent' as an example of a
+        # lowercase word.
+        words = letters_pattern.findall(sentence)
+        #
+        words = filter(lambda w: w != 'percent', words)
+        #
+        # Check that there's a lowercase letter in a word
+        if any(lowercase_pattern.match(w) for w in words):
+            return sentence
+
+        # Because we've now found that it's uppercase, we'll go through and
+        # see if we can change each word.
+        #
+        # If the original uppercase word is in the lexicon, we'll leave it
+        # because it may be an acronym. Additionally, unrecognized words
+        # will also be left as uppercase.
+        #
+        # There is ONE single-letter word in English that should remain
+        # lowercase: "a", so we'll deal with that immediately after this
+        # substitution (see `uppercase_word_pattern`)
+        def sub_word(w):
+            w = w.group(0)
+
+            # There's a special case for contractions like "I'm" and "I've":
+            # Because they're mixed case, we can't just write `w.lower()`,
+            # so we'll specifically filter out contractions that start with
+            # `I'`
+            if w.startswith("I'"):
+                lower = w[:2] + w[2:].lower()
+                if w in self.lexicon or lower not in self.lexicon:
+                    return w
+
+                return lower
+
+            if w in self.lexicon or w.lower() not in self.lexicon:
+                return w
+
+            return w.lower()
+        #
+        sentence = uppercase_word_pattern.sub(sub_word, sentence)
+        # Now we'll deal with "a". We just need to make sure that it's not
+        # part of an acronym
+        sentence = standalone_a_pattern.sub("a", sentence)
+
+        # Make sure that the first word is capitalized
+        sentence = first_letter_pattern.sub(lambda m: m[0].upper(), sentence)
+
+        return sentence
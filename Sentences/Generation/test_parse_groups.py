@@ -0,0 +1,57 @@
+# Checks that `parse_groups` in 'sentence_extractor.py' splits every subtitle file in
+# 'youtube-subtitles' into the same blocks as the regex it replaced, along with a few hand-written
+# edge cases.
+
+import io
+import os
+import re
+
+import gen_consts as gconsts
+from sentence_extractor import TextGroup, parse_groups
+
+# the old parser, which ran a backtracking regex over the whole file
+time_fmt = r"[0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{3}"
+time_line = r"({} --> {})[^\n]*\n".format(time_fmt, time_fmt)
+block_pattern = re.compile(r"(\n\d+)?\n{}(([^\n]*\n?)*?)(?=\n(\d+\n)?{}|$)".format(time_line, time_line))
+
+def regex_parse_groups(vtt_text):
+    return [TextGroup.from_text(m.group(2), m.group(3)) for m in block_pattern.finditer(vtt_text)]
+
+def as_tuples(groups):
+    return [(g.lines, g.start_ms, g.end_ms) for g in groups]
+
+def check(name, vtt_text):
+    expected = as_tuples(regex_parse_groups(vtt_text))
+    actual = as_tuples(parse_groups(io.StringIO(vtt_text)))
+    if actual != expected:
+        raise Exception("Blocks differ for '{}'".format(name))
+
+edge_cases = {
+    'basic': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nhello\n\n00:00:02.000 --> 00:00:03.000\nthere\n",
+    'cues': "WEBVTT\n\n1\n00:00:01.000 --> 00:00:02.000\nhello\n\n2\n00:00:02.000 --> 00:00:03.000\nthere\n",
+    'no final newline': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nhello\nthere",
+    'consecutive time lines': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\n00:00:02.000 --> 00:00:03.000\n"
+        "00:00:03.000 --> 00:00:04.000\nhello\n",
+    'no blank line': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nhello\n00:00:02.000 --> 00:00:03.000\nthere\n",
+    'number as only line': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\n\n42\n00:00:02.000 --> 00:00:03.000\nhello\n",
+    'unicode digits': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nhello\n\n٣٤\n00:00:02.000 --> 00:00:03.000\nthere\n",
+    'blank lines at the end': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nhello\n\n\n",
+    'settings': "WEBVTT\n\n00:00:01.000 --> 00:00:02.000 align:start position:0%\nhello\n\n",
+    'time line first': "00:00:01.000 --> 00:00:02.000\nhello\n\n00:00:02.000 --> 00:00:03.000\nthere\n",
+    'empty': "",
+}
+
+print('Testing edge cases')
+for name, text in edge_cases.items():
+    check(name, text)
+
+if not os.path.isdir(gconsts.subtitles_dir):
+    print("No subtitles found in '{}', skipping the rest".format(gconsts.subtitles_dir))
+else:
+    filenames = sorted(os.listdir(gconsts.subtitles_dir))
+    print('Testing {} subtitle files'.format(len(filenames)))
+    for filename in filenames:
+        with open(os.path.join(gconsts.subtitles_dir, filename)) as f:
+            check(filename, f.read())
+
+print('All blocks match')
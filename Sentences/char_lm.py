@@ -0,0 +1,289 @@
+# A character-level n-gram language model over the sentences in 'sentences.txt', for use while
+# decoding (see 'Model/beam_search.py').
+#
+# Each sentence is turned into labels with `sets.as_labels` (so it's framed by '^' and '$'), and the
+# model gives the probability of each label given up to `order - 1` labels before it. Probabilities
+# are smoothed with interpolated Witten-Bell smoothing, which mixes in the estimate from the next
+# shortest context in proportion to how many different labels have followed the longer one.
+#
+# A context of k labels is identified by a single integer key, with one base-(V + 1) digit per
+# label (where V is the size of the output set), most recent label first. Digits are offset by one
+# so that contexts of different lengths never share a key -- the empty context is 0.
+#
+# Every context that appears in the corpus gets a precomputed row of log probabilities over the
+# whole output set, so scoring a beam is a single row lookup. Rows are found through an
+# open-addressing hash table of context keys, so finding the longest known context for a beam takes
+# at most `order` hash lookups, no matter how large the model is. All of these lookups are done for
+# every beam at once.
+#
+# The model is saved as plain '.npy' files in 'char_lm/', which are memory-mapped when loaded, and
+# it's rebuilt automatically whenever the corpus changes.
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from . import sentence_consts as consts
+from . import sets
+
+__all__ = ['CharLM', 'CharLMScorer', 'load_lm']
+
+default_order = 5
+
+empty_key = -1
+
+# constant for Fibonacci hashing -- 2^64 divided by the golden ratio
+hash_multiplier = np.uint64(0x9E3779B97F4A7C15)
+
+num_labels = len(sets.output_set)
+base = num_labels + 1
+
+def hash_slots(keys, bits):
+	keys = np.asarray(keys, dtype=np.int64).astype(np.uint64)
+	return ((keys * hash_multiplier) >> np.uint64(64 - bits)).astype(np.int64)
+
+# returns the sentences used to train the model, with their punctuation removed in the same way as
+# `sets.from_id`. If 'sentences.txt' isn't present, the sentences in 'sentence_dict.json' are used
+# instead.
+def load_corpus():
+	if os.path.exists(consts.cleaned_sentences):
+		with open(consts.cleaned_sentences) as f:
+			sentences = f.read().split('\n')
+	else:
+		with open(consts.sentence_dict_file) as f:
+			sentences = list(json.load(f).values())
+
+	sentences = [sets.remove_punctuation_from(s) for s in sentences]
+	return [s for s in sentences if s != '']
+
+def corpus_hash(sentences, order):
+	h = hashlib.sha256('\n'.join(sentences).encode('utf-8'))
+
+	# the tables are indexed by the output set, so they need to be rebuilt if that changes, too
+	h.update(sets.output_set_str.encode('utf-8'))
+	h.update(str(order).encode('utf-8'))
+	return h.hexdigest()
+
+class CharLM():
+	# table_keys and table_rows make up the hash table: `table_keys[slot]` is the context key stored
+	# in that slot (or `empty_key`), and `table_rows[slot]` is its row in `log_probs`
+	def __init__(self, order, table_keys, table_rows, log_probs, max_probe):
+		self.order = order
+		self.table_keys = table_keys
+		self.table_rows = table_rows
+		self.log_probs = log_probs
+		self.max_probe = max_probe
+
+		self.bits = int(np.log2(len(table_keys)))
+		self.mask = len(table_keys) - 1
+		# contexts are trimmed to `order - 1` labels
+		self.context_modulus = base ** (order - 1)
+
+	def build(sentences, order=default_order):
+		if order < 1:
+			raise Exception('Order must be at least 1, got {}'.format(order))
+
+		seqs = [sets.as_labels(s) for s in sentences]
+		flat = np.array([l for seq in seqs for l in seq], dtype=np.int64)
+		# the position of each label within its sentence
+		position = np.concatenate([np.arange(len(seq)) for seq in seqs])
+
+		# every label except the starting '^' is predicted
+		targets = np.nonzero(position > 0)[0]
+		target_labels = flat[targets]
+
+		keys = []
+		rows = []
+
+		# The rows for each order are built from the ones for the order below, starting with the
+		# empty context, which is smoothed towards a uniform distribution.
+		parent_keys = np.zeros([1], dtype=np.int64)
+		parent_rows = np.full([1, num_labels], 1.0 / num_labels)
+
+		context = np.zeros(len(targets), dtype=np.int64)
+		for k in range(0, order):
+			# only the labels with at least k labels before them in their sentence have a context
+			# of this length
+			valid = position[targets] >= k
+			if k > 0:
+				# add the next oldest label as the most significant digit
+				context += np.where(valid, flat[targets - k] + 1, 0) * base ** (k - 1)
+
+			pairs, counts = np.unique(context[valid] * num_labels + target_labels[valid], return_counts=True)
+
+			contexts, index = np.unique(pairs // num_labels, return_inverse=True)
+			dense = np.zeros([len(contexts), num_labels])
+			dense[index, pairs % num_labels] = counts
+
+			total = dense.sum(axis=1, keepdims=True)
+			distinct = np.count_nonzero(dense, axis=1)[:, np.newaxis]
+
+			# the shorter context is the same, without the oldest label
+			parents = np.searchsorted(parent_keys, contexts % base ** max(k - 1, 0))
+			probs = (dense + distinct * parent_rows[parents]) / (total + distinct)
+
+			keys.append(contexts)
+			rows.append(probs)
+
+			parent_keys = contexts
+			parent_rows = probs
+
+		keys = np.concatenate(keys)
+		# Half precision is plenty for log probabilities that are only used to rank hypotheses, and
+		# it halves the size of the table.
+		log_probs = np.log(np.concatenate(rows)).astype(np.float16)
+
+		table_keys, table_rows, max_probe = CharLM.build_table(keys)
+		return CharLM(order, table_keys, table_rows, log_probs, max_probe)
+
+	# builds the hash table, with linear probing. All of the keys are inserted at once: on each
+	# round, every key that hasn't been placed tries the next slot along, and where several want the
+	# same free slot, the first one gets it.
+	def build_table(keys):
+		capacity = 1
+		while capacity < 2 * len(keys):
+			capacity *= 2
+		bits = int(np.log2(capacity))
+
+		table_keys = np.full([capacity], empty_key, dtype=np.int64)
+		table_rows = np.full([capacity], -1, dtype=np.int32)
+
+		slots = hash_slots(keys, bits)
+		pending = np.arange(len(keys))
+		probe = 0
+		while len(pending) > 0:
+			s = (slots[pending] + probe) & (capacity - 1)
+			free = np.nonzero(table_keys[s] == empty_key)[0]
+
+			_, first = np.unique(s[free], return_index=True)
+			placed = free[first]
+			table_keys[s[placed]] = keys[pending[placed]]
+			table_rows[s[placed]] = pending[placed]
+
+			if len(placed) == len(pending):
+				break
+
+			pending = np.delete(pending, placed)
+			probe += 1
+
+		return table_keys, table_rows, probe
+
+	def save(self, directory, corpus_hash):
+		os.makedirs(directory, exist_ok=True)
+
+		# the metadata is removed first and written last, so that an interrupted save is never
+		# mistaken for a complete one
+		meta_file = os.path.join(directory, 'meta.json')
+		if os.path.exists(meta_file):
+			os.remove(meta_file)
+
+		np.save(os.path.join(directory, 'table_keys.npy'), self.table_keys)
+		np.save(os.path.join(directory, 'table_rows.npy'), self.table_rows)
+		np.save(os.path.join(directory, 'log_probs.npy'), self.log_probs)
+
+		with open(meta_file, 'w') as f:
+			json.dump({'order': self.order, 'max_probe': self.max_probe, 'corpus_hash': corpus_hash}, f)
+
+	# returns the model saved in `directory`, memory-mapped, along with the hash of the corpus it was
+	# built from
+	def load(directory):
+		with open(os.path.join(directory, 'meta.json')) as f:
+			meta = json.load(f)
+
+		def load_array(name):
+			return np.load(os.path.join(directory, name), mmap_mode='r')
+
+		lm = CharLM(meta['order'], load_array('table_keys.npy'), load_array('table_rows.npy'),
+		            load_array('log_probs.npy'), meta['max_probe'])
+		return lm, meta['corpus_hash']
+
+	# returns the row in `log_probs` for each of the context keys, or -1 where the context isn't in
+	# the model
+	def find(self, keys):
+		rows = np.full([len(keys)], -1, dtype=np.int32)
+
+		slots = hash_slots(keys, self.bits)
+		pending = np.arange(len(keys))
+		for probe in range(self.max_probe + 1):
+			s = (slots[pending] + probe) & self.mask
+			found = self.table_keys[s]
+
+			hit = found == keys[pending]
+			rows[pending[hit]] = self.table_rows[s[hit]]
+
+			# an empty slot means the key isn't there
+			pending = pending[~hit & (found != empty_key)]
+			if len(pending) == 0:
+				break
+
+		return rows
+
+	# returns the rows for the longest known suffix of each context
+	def context_rows(self, contexts):
+		rows = np.full([len(contexts)], -1, dtype=np.int32)
+
+		pending = np.arange(len(contexts))
+		for k in range(self.order - 1, -1, -1):
+			found = self.find(contexts[pending] % base ** k)
+			rows[pending] = found
+
+			pending = pending[found < 0]
+			if len(pending) == 0:
+				break
+
+		return rows
+
+	# the context at the start of a sentence, i.e. just '^'
+	def start_context(self):
+		return (sets.char_dict['^'] + 1) % self.context_modulus
+
+	# returns the log probabilities of every label after each of the contexts, with shape
+	# (len(contexts), len(output_set))
+	def log_probs_after(self, contexts):
+		return self.log_probs[self.context_rows(contexts)].astype(np.float32)
+
+	# returns the contexts after outputting `labels`
+	def advance(self, contexts, labels):
+		return (contexts * base + labels + 1) % self.context_modulus
+
+lm = None
+# returns the language model for the corpus, building it (and saving it to disk) if there isn't an
+# up-to-date copy
+def load_lm(order=default_order):
+	global lm
+	if lm is not None and lm.order == order:
+		return lm
+
+	sentences = load_corpus()
+	h = corpus_hash(sentences, order)
+
+	try:
+		lm, saved_hash = CharLM.load(consts.char_lm_dir)
+		if saved_hash == h:
+			return lm
+	except FileNotFoundError:
+		pass
+
+	lm = CharLM.build(sentences, order)
+	lm.save(consts.char_lm_dir, h)
+
+	return lm
+
+# A scorer for 'Model/beam_search.py' that adds the language model's log probability of each
+# output, multiplied by `weight` (i.e. shallow fusion). The state for each beam is the key of its
+# context.
+class CharLMScorer():
+	def __init__(self, lm, weight):
+		self.lm = lm
+		self.weight = weight
+
+	def initial_state(self, beam_width):
+		return np.full([beam_width], self.lm.start_context(), dtype=np.int64)
+
+	def scores(self, contexts):
+		return self.weight * self.lm.log_probs_after(contexts)
+
+	def advance(self, contexts, tokens):
+		return self.lm.advance(contexts, tokens)
@@ -0,0 +1,139 @@
+# A persistent index from the SHA-256 hash of each sentence to its id. The server names the
+# directories of uploaded videos with these hashes (see 'Server/src/io.go'), so this is how an
+# upload is matched back to its sentence.
+#
+# The index is built from 'sentences.txt' (where the id is the line number, as with `sets.from_id`)
+# or, if that isn't present, from 'sentence_dict.json'. It's stored as two '.npy' files in
+# 'hash_index/': the raw 32-byte digests in sorted order, and the id for each one. These are
+# memory-mapped when loaded, so a lookup is a binary search over the digests, and it only touches
+# the few pages of the files that the search goes through -- the corpus itself is never read.
+#
+# The size and modification time of the corpus are saved with the index, and the index is rebuilt
+# whenever they change, so it stays consistent when the sentences are regenerated.
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from . import sentence_consts as consts
+
+__all__ = ['HashIndex', 'load_index']
+
+digest_dtype = 'S{}'.format(hashlib.sha256().digest_size)
+
+# returns the file that the index is built from
+def corpus_file():
+	if os.path.exists(consts.cleaned_sentences):
+		return consts.cleaned_sentences
+	return consts.sentence_dict_file
+
+# returns enough about the corpus to tell when it's changed, without reading it
+def corpus_stamp(path):
+	stat = os.stat(path)
+	return {'file': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+# returns a pair of (ids, sentences) from the corpus in `path`
+def load_corpus(path):
+	if path == consts.cleaned_sentences:
+		# the server splits the file in the same way
+		with open(path) as f:
+			sentences = f.read().split('\n')
+		return list(range(len(sentences))), sentences
+
+	with open(path) as f:
+		sentence_dict = json.load(f)
+	return [int(i) for i in sentence_dict.keys()], list(sentence_dict.values())
+
+# converts hashes given in hex into the format stored in the index
+def as_digests(hex_hashes):
+	digests = []
+	for h in hex_hashes:
+		try:
+			digests.append(bytes.fromhex(h))
+		except ValueError:
+			# this can't match anything
+			digests.append(b'')
+
+	return np.array(digests, dtype=digest_dtype)
+
+class HashIndex():
+	# digests is sorted, and `ids[i]` is the id of the sentence with hash `digests[i]`
+	def __init__(self, digests, ids):
+		self.digests = digests
+		self.ids = ids
+
+	def build(ids, sentences):
+		digests = np.array([hashlib.sha256(s.encode('utf-8')).digest() for s in sentences], dtype=digest_dtype)
+		ids = np.array(ids, dtype=np.int64)
+
+		# If a sentence appears more than once, the first id is used. `np.unique` gives the first
+		# occurrence of each digest, with the digests sorted.
+		digests, first = np.unique(digests, return_index=True)
+		return HashIndex(digests, ids[first])
+
+	def save(self, directory, stamp):
+		os.makedirs(directory, exist_ok=True)
+
+		# the metadata is removed first and written last, so that an interrupted save is never
+		# mistaken for a complete one
+		meta_file = os.path.join(directory, 'meta.json')
+		if os.path.exists(meta_file):
+			os.remove(meta_file)
+
+		np.save(os.path.join(directory, 'digests.npy'), self.digests)
+		np.save(os.path.join(directory, 'ids.npy'), self.ids)
+
+		with open(meta_file, 'w') as f:
+			json.dump({'corpus': stamp}, f)
+
+	# returns the index saved in `directory`, memory-mapped, along with the stamp of the corpus it was
+	# built from
+	def load(directory):
+		with open(os.path.join(directory, 'meta.json')) as f:
+			meta = json.load(f)
+
+		index = HashIndex(np.load(os.path.join(directory, 'digests.npy'), mmap_mode='r'),
+						  np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r'))
+		return index, meta['corpus']
+
+	# returns the ids of the sentences with the given hashes (in hex), with -1 for the ones that
+	# aren't in the index
+	def ids_from_hashes(self, hex_hashes):
+		digests = as_digests(hex_hashes)
+		if len(self.digests) == 0:
+			return np.full([len(digests)], -1, dtype=np.int64)
+
+		i = np.minimum(np.searchsorted(self.digests, digests), len(self.digests) - 1)
+		return np.where(self.digests[i] == digests, self.ids[i], -1)
+
+	# returns the id of the sentence with the given hash (in hex), or None if there isn't one
+	def id_from_hash(self, hex_hash):
+		i = self.ids_from_hashes([hex_hash])[0]
+		return None if i < 0 else int(i)
+
+index = None
+index_stamp = None
+# returns the index for the current corpus, building it (and saving it to disk) if there isn't an
+# up-to-date copy
+def load_index():
+	global index, index_stamp
+
+	path = corpus_file()
+	stamp = corpus_stamp(path)
+	if index is not None and index_stamp == stamp:
+		return index
+
+	try:
+		index, index_stamp = HashIndex.load(consts.hash_index_dir)
+		if index_stamp == stamp:
+			return index
+	except FileNotFoundError:
+		pass
+
+	index = HashIndex.build(*load_corpus(path))
+	index_stamp = stamp
+	index.save(consts.hash_index_dir, stamp)
+
+	return index
@@ -0,0 +1,134 @@
+# Every sentence, already turned into labels, so that training doesn't have to read the sentences
+# (or remove their punctuation, or convert them) each time it needs the labels for a recording.
+#
+# The labels for sentence `i` are the same as `sets.as_labels(sets.from_id(i))`. They're stored as
+# one flat int8 array of the labels of every sentence in order of id, along with an array of
+# offsets, where the labels for sentence `i` are `labels[offsets[i]:offsets[i + 1]]`. Both are saved
+# as '.npy' files in 'label_store/' and memory-mapped when loaded, so the labels for a sentence are
+# just a slice of the file, without any copying.
+#
+# The store is built from the same corpus as 'hash_index.py', and it's rebuilt in the same way
+# whenever the corpus (or the output set) changes. If it's built from 'sentence_dict.json', ids that
+# aren't in the dict have no labels.
+
+import os
+import json
+
+import numpy as np
+
+from . import sentence_consts as consts
+from . import sets
+from .hash_index import corpus_file, corpus_stamp, load_corpus
+
+__all__ = ['LabelStore', 'load_store']
+
+# maps each byte of a UTF-8 sentence to its label, or -1 if it isn't in the output set. Every byte of
+# a multi-byte character is outside of the output set, so those are removed in the same way as by
+# `sets.remove_punctuation_from`.
+byte_labels = np.full([256], -1, dtype=np.int8)
+for c, i in sets.char_dict.items():
+	byte_labels[ord(c)] = i
+
+class LabelStore():
+	def __init__(self, labels, offsets):
+		self.flat_labels = labels
+		self.offsets = offsets
+
+	def build(ids, sentences):
+		order = np.argsort(ids, kind='stable')
+		ids = np.array(ids, dtype=np.int64)[order]
+		framed = ['^' + sentences[i] + '$' for i in order]
+
+		# All of the sentences are converted at once, as one long string of bytes
+		raw = np.frombuffer(''.join(framed).encode('utf-8'), dtype=np.uint8)
+		starts = np.cumsum([0] + [len(s.encode('utf-8')) for s in framed[:-1]])
+
+		labels = byte_labels[raw]
+		keep = labels >= 0
+		counts = np.add.reduceat(keep.astype(np.int64), starts) if len(framed) > 0 else np.zeros([0], dtype=np.int64)
+
+		# ids without a sentence are given no labels
+		num_ids = int(ids[-1]) + 1 if len(ids) > 0 else 0
+		dense_counts = np.zeros([num_ids], dtype=np.int64)
+		dense_counts[ids] = counts
+
+		offsets = np.concatenate([[0], np.cumsum(dense_counts)]).astype(np.int64)
+		return LabelStore(labels[keep], offsets)
+
+	def save(self, directory, stamp):
+		os.makedirs(directory, exist_ok=True)
+
+		# the metadata is removed first and written last, so that an interrupted save is never
+		# mistaken for a complete one
+		meta_file = os.path.join(directory, 'meta.json')
+		if os.path.exists(meta_file):
+			os.remove(meta_file)
+
+		np.save(os.path.join(directory, 'labels.npy'), self.flat_labels)
+		np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+
+		with open(meta_file, 'w') as f:
+			json.dump({'corpus': stamp}, f)
+
+	# returns the store saved in `directory`, memory-mapped, along with the stamp of the corpus it was
+	# built from
+	def load(directory):
+		with open(os.path.join(directory, 'meta.json')) as f:
+			meta = json.load(f)
+
+		store = LabelStore(np.load(os.path.join(directory, 'labels.npy'), mmap_mode='r'),
+						   np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r'))
+		return store, meta['corpus']
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	# returns the labels for the sentence with the given id, as a read-only view into the store
+	def labels(self, id_num):
+		start, end = self.offsets[id_num], self.offsets[id_num + 1]
+		# every sentence has at least the start and end labels
+		if start == end:
+			raise Exception('No sentence with id {}'.format(id_num))
+
+		return self.flat_labels[start:end]
+
+	# returns the labels for each of the given ids at once, as a pair of (labels, lengths), where
+	# `labels` has shape (len(ids), max(lengths)) and is padded with zeros
+	def batch(self, ids):
+		ids = np.asarray(ids, dtype=np.int64)
+		starts = self.offsets[ids]
+		lengths = self.offsets[ids + 1] - starts
+		if np.any(lengths == 0):
+			raise Exception('No sentence with id {}'.format(ids[lengths == 0][0]))
+
+		positions = np.arange(lengths.max() if len(ids) > 0 else 0)
+		valid = positions < lengths[:, np.newaxis]
+		indices = np.where(valid, starts[:, np.newaxis] + positions, 0)
+
+		return np.where(valid, self.flat_labels[indices], 0).astype(np.int32), lengths.astype(np.int32)
+
+store = None
+store_stamp = None
+# returns the label store for the current corpus, building it (and saving it to disk) if there
+# isn't an up-to-date copy
+def load_store():
+	global store, store_stamp
+
+	path = corpus_file()
+	# the labels depend on the output set, too
+	stamp = dict(corpus_stamp(path), output_set=sets.output_set_str)
+	if store is not None and store_stamp == stamp:
+		return store
+
+	try:
+		store, store_stamp = LabelStore.load(consts.label_store_dir)
+		if store_stamp == stamp:
+			return store
+	except FileNotFoundError:
+		pass
+
+	store = LabelStore.build(*load_corpus(path))
+	store_stamp = stamp
+	store.save(consts.label_store_dir, stamp)
+
+	return store
@@ -0,0 +1,154 @@
+# A prefix trie over the words in the lexicon, used to restrict decoding to sentences that are made
+# up of lexicon words.
+#
+# The trie is stored as a single array-backed table of transitions: `transitions[node, label]` gives
+# the node reached by outputting `label` (an index into `sets.output_set`) from `node`, or -1 if that
+# output isn't allowed there. Node 0 is the root, i.e. the start of a word. Words are matched with
+# the casing they have in the lexicon, except that the first letter of a lowercase word may also be
+# capitalised (e.g. at the start of a sentence) -- so 'ensured' and 'Ensured' are allowed, but not
+# 'enSUreD', and 'I' or 'TV' only as they are. From any node that ends a word, a space goes back to
+# the root and '$' ends the sentence.
+#
+# Building the trie takes a little while, so it's cached in 'Lexicon/lexicon_trie.npz', along with a
+# hash of the lexicon it was built from. It's rebuilt automatically when the lexicon changes.
+
+import re
+import hashlib
+
+import numpy as np
+
+from . import sentence_consts as consts
+from . import sets
+
+__all__ = ['LexiconTrie', 'LexiconConstraint', 'load_trie']
+
+root = 0
+
+# the version of the table built by `LexiconTrie.build`, so that an older cached copy isn't used
+trie_version = 2
+
+# words are matched against sentences after `sets.from_id` has removed their punctuation, so we do
+# the same here (e.g. "aren't" -> "arent"). The case is left alone.
+def normalize_word(word):
+	return re.sub('[^a-zA-Z]', '', word)
+
+class LexiconTrie():
+	def __init__(self, transitions):
+		self.transitions = transitions
+
+	def build(words):
+		# first, build the trie as a list of dicts of children
+		children = [{}]
+		is_word = [False]
+
+		def new_node():
+			children.append({})
+			is_word.append(False)
+			return len(children) - 1
+
+		for word in words:
+			node = root
+			for c in word:
+				if c not in children[node]:
+					children[node][c] = new_node()
+
+				node = children[node][c]
+
+			is_word[node] = True
+
+		# returns a new node that has the children of both `a` and `b`. Anything that's only under one
+		# of them is shared rather than copied.
+		def merge(a, b):
+			node = new_node()
+			is_word[node] = is_word[a] or is_word[b]
+			for c in set(children[a]) | set(children[b]):
+				if c in children[a] and c in children[b]:
+					children[node][c] = merge(children[a][c], children[b][c])
+				else:
+					children[node][c] = children[a].get(c, children[b].get(c))
+
+			return node
+
+		# Only the first letter of a word can be capitalised, so the uppercase edges from the root also
+		# lead to the words that start with the lowercase letter
+		for c, child in list(children[root].items()):
+			if c.islower():
+				upper = c.upper()
+				children[root][upper] = merge(children[root][upper], child) if upper in children[root] else child
+
+		# then flatten it into the table
+		transitions = np.full([len(children), len(sets.output_set)], -1, dtype=np.int32)
+
+		for node, edges in enumerate(children):
+			for c, child in edges.items():
+				transitions[node, sets.char_dict[c]] = child
+
+			if is_word[node]:
+				transitions[node, sets.char_dict[' ']] = root
+				transitions[node, sets.char_dict['$']] = root
+
+		return LexiconTrie(transitions)
+
+	def num_nodes(self):
+		return self.transitions.shape[0]
+
+	# returns whether each label is allowed from each of the given nodes, with shape
+	# (len(nodes), len(output_set))
+	def allowed(self, nodes):
+		return self.transitions[nodes] >= 0
+
+	# returns the nodes reached by outputting `labels` from `nodes`
+	def advance(self, nodes, labels):
+		return self.transitions[nodes, labels]
+
+def lexicon_hash():
+	with open(consts.lexicon_file, 'rb') as f:
+		h = hashlib.sha256(f.read())
+
+	# the table is indexed by the output set, so it needs to be rebuilt if that changes, too
+	h.update(sets.output_set_str.encode('utf-8'))
+	h.update(str(trie_version).encode('utf-8'))
+	return h.hexdigest()
+
+trie = None
+# returns the trie for the lexicon, building it (and saving it to disk) if there isn't an
+# up-to-date copy
+def load_trie():
+	global trie
+	if trie is not None:
+		return trie
+
+	h = lexicon_hash()
+
+	try:
+		with np.load(consts.lexicon_trie_file) as data:
+			if str(data['lexicon_hash']) == h:
+				trie = LexiconTrie(data['transitions'])
+				return trie
+	except FileNotFoundError:
+		pass
+
+	with open(consts.lexicon_file) as f:
+		words = set(normalize_word(w) for w in f.read().split('\n'))
+	words.discard('')
+
+	trie = LexiconTrie.build(sorted(words))
+	np.savez(consts.lexicon_trie_file, transitions=trie.transitions, lexicon_hash=np.array(h))
+
+	return trie
+
+# A scorer for 'Model/beam_search.py' that only allows outputs that continue a word in the lexicon
+# (or, at the end of a word, a space or the end of the sentence). The state for each beam is its
+# current node in the trie.
+class LexiconConstraint():
+	def __init__(self, trie):
+		self.trie = trie
+
+	def initial_state(self, beam_width):
+		return np.full([beam_width], root, dtype=np.int32)
+
+	def scores(self, nodes):
+		return np.where(self.trie.allowed(nodes), 0.0, -np.inf)
+
+	def advance(self, nodes, tokens):
+		return self.trie.advance(nodes, tokens)
@@ -10,9 +10,13 @@ lexicon_dir = wrap('Lexicon')
 gen_dir = wrap('Generation')
 
 lexicon_file = os.path.join(lexicon_dir, 'lexicon.txt')
+lexicon_trie_file = os.path.join(lexicon_dir, 'lexicon_trie.npz')
 
 sentences_subset = wrap('sentences_subset.txt')
 annotated_sentences_file = wrap('sentences_subset_annotated.txt')
 sentence_dict_file = wrap('sentence_dict.json')
 cleaned_sentences = wrap('sentences.txt')
-random_sentence_list = wrap('random_sentences.txt')
\ No newline at end of file
+random_sentence_list = wrap('random_sentences.txt')
+char_lm_dir = wrap('char_lm')
+hash_index_dir = wrap('hash_index')
+label_store_dir = wrap('label_store')
\ No newline at end of file
@@ -4,8 +4,9 @@ import re
 import json
 
 from . import sentence_consts as consts
+from . import hash_index
 
-__all__ = ['from_id', 'as_labels', 'load_sentences', 'unload_sentences']
+__all__ = ['from_id', 'id_from_hash', 'as_labels', 'load_sentences', 'unload_sentences']
 
 sentences = None
 # preloads the sentences in memory so that we don't have to repeatedly read the file.
@@ -27,10 +28,19 @@ def from_id(id_num, remove_punctuation=True):
 	unload_sentences()
 
 	if remove_punctuation:
-		s = re.sub('[^' + output_set_str + ']', '', s)
+		s = remove_punctuation_from(s)
 
 	return s
 
+# returns the id of the sentence with the given SHA-256 hash (in hex), or None if there isn't one.
+# The server names the directories of uploaded videos with these hashes (see 'Server/src/io.go').
+def id_from_hash(sentence_hash):
+	return hash_index.load_index().id_from_hash(sentence_hash)
+
+# removes every character that isn't in the output set
+def remove_punctuation_from(s):
+	return re.sub('[^' + output_set_str + ']', '', s)
+
 # '^' and '$' signify the start and end of the sequence, respectively
 output_set_str = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz ^$'
 output_set = list(output_set_str)
@@ -10,20 +10,52 @@ data_dir = wrap('Data')
 import_dir = wrap('Import')
 source_data_dir = wrap('SourceData')
 checkpoint_dir = wrap('Checkpoints')
+# see `landmark_cache_path` in 'Convert/convert_helper.py'
+landmark_cache_dir = wrap('LandmarkCache')
 checkpoint_prefix = wrap('Checkpoints/ckpt')
 
 num_total_file = 'total'
 left_eye_format = "l_{}.jpg"
 right_eye_format = "r_{}.jpg"
+# if `write_packed_eyes` is True, conversion writes the eyes for all of the frames of a recording
+# into this file (in its subdirectory of 'Data/') instead of as separate images
+packed_eyes_file = "eyes.bin"
+write_packed_eyes = False
 
 output_height = 20
 output_width = 30
 fps = 30
 namespace_path = wrap('Convert/namespace.json')
+# records the progress of 'Convert/convert_script.py', so that it can pick up where it left off
+conversion_progress_path = wrap('Convert/progress.json')
+# records which videos have been converted, and how -- see 'Convert/manifest.py'
+conversion_manifest_path = wrap('Convert/manifest.sqlite')
+# the number of videos converted at once
+num_conversion_workers = os.cpu_count()
+# During conversion, the face is detected on every `face_detection_interval`th frame, and those
+# frames are given to the detector in batches of `face_detection_batch_size`. In between, the face
+# is followed with `face_tracking`, which is either 'interpolate' (the box moves linearly between
+# detections) or 'correlation' (dlib's correlation tracker, which is slower). If the interval is
+# None, the face is only detected in the first frame, and that box is used for the whole video.
+face_detection_interval = 15
+face_detection_batch_size = 4
+face_tracking = 'interpolate'
+# the number of frames that have their eyes cropped at once during conversion
+crop_batch_size = 64
+# where the server ('Server/src/io.go') stores uploaded videos, which are brought into the dataset by
+# 'Convert/ingest_script.py'. It checks for new uploads every `ingest_scan_interval` seconds, and an
+# upload is only used once neither of its files has changed for `ingest_settle_time` seconds.
+server_data_dir = wrap('Server/data')
+ingest_scan_interval = 10
+ingest_settle_time = 5
 face_detector_path = wrap('Convert/mmod_human_face_detector.dat')
 facial_landmark_detector_path = wrap('Convert/shape_predictor_68_face_landmarks.dat')
 img_file_format = "%d.jpg"
 
+# the packed form of 'Data/' -- see 'packed_data.py'
+packed_data_file = wrap('Data/packed.bin')
+packed_index_file = wrap('Data/packed_index.json')
+
 from Sentences import sets
 
 # the final model output size
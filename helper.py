@@ -1,16 +1,21 @@
 # an assorted collection of things that are referenced by 'main.py', but do not need to be defined
 # there.
-import random
 import json
 import os
 from os import path
 import timeit
 
+import numpy as np
 import tensorflow as tf
-import cv2
 
 import consts
+import packed_data
+from Model.model import apply_per_frame
+from Model.beam_search import beam_search
 from Sentences import sets
+from Sentences import lexicon_trie
+from Sentences import char_lm
+from Sentences import label_store
 
 # the set of videos we'll pull from
 set_of_videos = []
@@ -20,60 +25,167 @@ with open(consts.namespace_path) as f:
         for i in range(0, n):
             set_of_videos.append((int(video_id), i))
 
+# if the data has been packed (with 'pack_data_script.py'), we'll read from that instead of the
+# individual JPEGs. The store is memory-mapped, so it's cheap to keep around for the whole run.
+eye_store = None
+if path.exists(consts.packed_index_file):
+    eye_store = packed_data.PackedStore()
+
+# returns a tuple of two tensors -- the left eye and the right eye -- each with shape
+# (frames, output_height, output_width, 3)
 def get_images(video, n):
-    subdir = path.join(consts.data_dir, "{}-{}".format(video, n))
+    if eye_store is not None and (video, n) in eye_store:
+        frames = tf.convert_to_tensor(eye_store[(video, n)], dtype=tf.float32)
+    else:
+        frames = tf.convert_to_tensor(packed_data.read_converted_recording(video, n), dtype=tf.float32)
 
-    total = path.join(subdir, consts.num_total_file)
-    if not path.exists(total):
-        raise Exception("No total file found ('{}' does not exist)".format(total))
-    with open(total) as f:
-        size = int(f.read().strip())
+    return (frames[:, 0], frames[:, 1])
 
-    left_imgs = []
-    right_imgs = []
+# Builds the input pipeline for training: a `tf.data.Dataset` over `set_of_videos` that yields
+# batches of ((left, right, frame_lengths), (labels, label_lengths)). `left` and `right` are given
+# by `get_images` and `labels` by the label store (see 'Sentences/label_store.py'), each padded
+# (with zeros) to the length of the longest in the batch. `frame_lengths` and `label_lengths` give
+# the original lengths.
+#
+# Recordings are bucketed by their number of frames, with `bucket_boundaries` giving the edges of
+# each bucket, so that recordings of similar lengths are batched together and there's little
+# padding. Each batch holds up to `batch_size` recordings.
+#
+# For compiled training (see `make_compiled_train_step`), every new shape of input can mean another
+# compilation. To keep the number of shapes small, batches can be padded further: the frames to a
+# multiple of `frame_pad_multiple`, and the labels to a multiple of `label_pad_multiple`.
+#
+# Loading is done with a parallel map, with `num_parallel_reads` recordings being read (and their
+# labels built) at once, and the results are prefetched so that the input for the next step is
+# prepared while the current one is training. The order is reshuffled every epoch with a shuffle
+# buffer of `shuffle_buffer_size` recordings -- by default, the entire set.
+def make_dataset(batch_size=1, bucket_boundaries=(), frame_pad_multiple=1, label_pad_multiple=1,
+                 num_parallel_reads=tf.data.experimental.AUTOTUNE, shuffle_buffer_size=None,
+                 prefetch_size=tf.data.experimental.AUTOTUNE):
+    if shuffle_buffer_size is None:
+        shuffle_buffer_size = max(len(set_of_videos), 1)
 
-    for i in range(0, size):
-        left_path = path.join(subdir, consts.left_eye_format.format(i))
-        right_path = path.join(subdir, consts.right_eye_format.format(i))
+    ids = np.array(set_of_videos, dtype=np.int32).reshape([-1, 2])
 
-        l_img = cv2.imread(left_path)
-        r_img = cv2.imread(right_path)
+    # the labels for every sentence, ready to go
+    labels_by_id = label_store.load_store()
 
-        if l_img is None:
-            raise Exception("File '{}' not found.".format(left_path))
-        if r_img is None:
-            raise Exception("File '{}' not found.".format(right_path))
-        
-        left_imgs.append(tf.convert_to_tensor(l_img, dtype=tf.float32))
-        right_imgs.append(tf.convert_to_tensor(r_img, dtype=tf.float32))
+    dset = tf.data.Dataset.from_tensor_slices(ids)
+    dset = dset.shuffle(shuffle_buffer_size, reshuffle_each_iteration=True)
 
-        # left_imgs.append(tf.convert_to_tensor(cv2.imread(left_path), dtype=tf.float32))
-        # right_imgs.append(tf.convert_to_tensor(cv2.imread(right_path), dtype=tf.float32))
+    def load(ids):
+        video, n = int(ids[0]), int(ids[1])
 
-    return (tf.convert_to_tensor(left_imgs), tf.convert_to_tensor(right_imgs))
+        left, right = get_images(video, n)
+        labels = tf.convert_to_tensor(labels_by_id.labels(video).astype(np.int32))
 
-def loss_function(real, pred):
-    mask = tf.math.logical_not(tf.math.equal(real, 0))
-    loss_ = loss_object(real, pred)
+        return left, right, labels
 
-    mask = tf.cast(mask, dtype=loss_.dtype)
-    loss_ *= mask
+    def load_wrapper(ids):
+        left, right, labels = tf.py_function(load, [ids], [tf.float32, tf.float32, tf.int32])
+
+        # py_function loses the shapes, so we restore them here
+        input_shape = [None, consts.output_height, consts.output_width, 3]
+        left.set_shape(input_shape)
+        right.set_shape(input_shape)
+        labels.set_shape([None])
+
+        return (left, right, tf.shape(left)[0]), (labels, tf.shape(labels)[0])
+
+    dset = dset.map(load_wrapper, num_parallel_calls=num_parallel_reads)
+
+    dset = dset.apply(tf.data.experimental.bucket_by_sequence_length(
+        element_length_func=lambda inputs, targets: inputs[2],
+        bucket_boundaries=list(bucket_boundaries),
+        bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1)))
+
+    if frame_pad_multiple != 1 or label_pad_multiple != 1:
+        def pad_to_multiple(t, multiple):
+            length = tf.shape(t)[1]
+            extra = (multiple - length % multiple) % multiple
+
+            padding = [[0, 0], [0, extra]] + [[0, 0]] * (len(t.shape) - 2)
+            return tf.pad(t, padding)
+
+        def pad_batch(inputs, targets):
+            (left, right, frame_lengths) = inputs
+            (labels, label_lengths) = targets
 
-    return tf.reduce_mean(loss_)
+            left = pad_to_multiple(left, frame_pad_multiple)
+            right = pad_to_multiple(right, frame_pad_multiple)
+            labels = pad_to_multiple(labels, label_pad_multiple)
 
-def index_list():
-    l = set_of_videos.copy()
-    random.shuffle(l)
-    return l
+            return (left, right, frame_lengths), (labels, label_lengths)
+
+        dset = dset.map(pad_batch)
+
+    return dset.prefetch(prefetch_size)
 
 def trial_with_random(img_process, dsbrnn, speller):
     # this is just an arbitrarily chosen number
     seq_len = 32
     input_shape = [consts.output_height, consts.output_width, 3]
-    random_left = tf.random.uniform([seq_len] + input_shape)
-    random_right = tf.random.uniform([seq_len] + input_shape)
+    random_left = tf.random.uniform([1, seq_len] + input_shape)
+    random_right = tf.random.uniform([1, seq_len] + input_shape)
+    lengths = tf.constant([seq_len])
+
+    encoded = dsbrnn([apply_per_frame(img_process, random_left), apply_per_frame(img_process, random_right), lengths])
+    _, _ = speller(encoded, None)
+
+    speller.reset()
+
+# Decodes a single recording with beam search, returning a list of up to `top_k` pairs of
+# (sentence, score), best first. `left` and `right` are sequences of images, as given by
+# `get_images`.
+#
+# See 'Model/beam_search.py' for more about `beam_width` and `length_penalty`. If
+# `restrict_to_lexicon` is True, only sentences made up of words in the lexicon are considered. If
+# `lm_weight` is nonzero, the scores from the character language model in 'Sentences/char_lm.py'
+# are added in, multiplied by `lm_weight`.
+def decode(img_process, dsbrnn, speller, left, right, **kwargs):
+    left = tf.expand_dims(left, axis=0)
+    right = tf.expand_dims(right, axis=0)
+    lengths = tf.shape(left)[1:2]
+
+    encoded = dsbrnn([apply_per_frame(img_process, left), apply_per_frame(img_process, right), lengths])
+
+    return decode_encoded(speller, encoded, **kwargs)
+
+# Decodes a recording while it's still being made, using a `StreamingWatcher` (from
+# 'Model/streaming.py'). `chunks` is an iterable of pairs of (left, right), each holding the next
+# few frames of the recording in the same format as `get_images`.
+#
+# After each chunk, this yields the result of decoding everything so far, in the same format as
+# `decode` (and with the same options). These are only partial hypotheses -- they're decoded again
+# from the start after every chunk, so they can change as more of the recording comes in.
+def decode_stream(img_process, watcher, speller, chunks, **kwargs):
+    watcher.reset()
+
+    for left, right in chunks:
+        watcher.push(apply_per_frame(img_process, tf.expand_dims(left, axis=0)),
+                     apply_per_frame(img_process, tf.expand_dims(right, axis=0)))
+
+        # nothing to attend to yet
+        if watcher.length() == 0:
+            yield []
+            continue
 
-    _, _ = speller(dsbrnn([img_process(random_left), img_process(random_right)]), None)
+        yield decode_encoded(speller, watcher.encoded(), **kwargs)
+
+# the part of `decode` that comes after the encoder
+def decode_encoded(speller, encoded, beam_width=8, top_k=1, max_length=100, length_penalty=0.6,
+                   restrict_to_lexicon=False, lm_weight=0.0):
+    scorers = []
+    if restrict_to_lexicon:
+        scorers.append(lexicon_trie.LexiconConstraint(lexicon_trie.load_trie()))
+    if lm_weight != 0.0:
+        scorers.append(char_lm.CharLMScorer(char_lm.load_lm(), lm_weight))
+
+    results = beam_search(speller, encoded, sets.char_dict['^'], sets.char_dict['$'],
+                          beam_width=beam_width, top_k=top_k, max_length=max_length,
+                          length_penalty=length_penalty, scorers=scorers)
+
+    return [(''.join(sets.output_set[i] for i in labels), score) for score, labels in results]
 
 # The following section is taken directly form the tensorflow 2.0 tutorial:
 # https://www.tensorflow.org/beta/tutorials/text/nmt_with_attention#define_the_optimizer_and_the_loss_function
@@ -81,41 +193,104 @@ optimizer = tf.keras.optimizers.Adam()
 loss_object = tf.keras.losses.SparseCategoricalCrossentropy(
         from_logits=True, reduction='none')
 
-def loss_function(real, pred):
-    mask = tf.math.logical_not(tf.math.equal(real, 0))
+# returns the total loss over the items in the batch where `mask` is True
+def loss_function(real, pred, mask):
     loss_ = loss_object(real, pred)
 
     mask = tf.cast(mask, dtype=loss_.dtype)
     loss_ *= mask
 
-    return tf.reduce_mean(loss_)
+    return tf.reduce_sum(loss_)
 
-# inputs is a tuple of two tensors, left eye and right eye
+# inputs is a tuple of (left, right, frame_lengths) and targets is a tuple of (labels,
+# label_lengths), as given by `make_dataset`
 def train_step(img_process, dsbrnn, speller, inputs, targets):
+    (left, right, frame_lengths) = inputs
+    (labels, label_lengths) = targets
+
     loss = 0
 
+    # the first label of each sequence is the start character, so it's never predicted
+    num_predictions = tf.cast(tf.reduce_sum(label_lengths - 1), tf.float32)
+
     with tf.GradientTape() as tape:
-        values = dsbrnn([img_process(inputs[0]), img_process(inputs[1])])
+        encoded = dsbrnn([apply_per_frame(img_process, left), apply_per_frame(img_process, right), frame_lengths])
 
         # teacher forcing, so we'll disregard the previous
-        speller_input = tf.expand_dims(tf.one_hot(targets[0], len(sets.output_set), dtype=tf.float32), axis=0)
-        for t in targets[1:]:
+        speller_input = tf.one_hot(labels[:, 0], len(sets.output_set), dtype=tf.float32)
+        for t in range(1, labels.shape[1]):
             # returns output, rnn_state
-            predictions, _ = speller(values, speller_input)
+            predictions, _ = speller(encoded, speller_input)
 
-            loss += loss_function(tf.expand_dims(t, axis=0), predictions)
+            # sequences that have already finished are padding at this point
+            loss += loss_function(labels[:, t], predictions, t < label_lengths)
 
             # teacher forcing
-            speller_input = tf.expand_dims(tf.one_hot(t, len(sets.output_set), dtype=tf.float32), axis=0)
+            speller_input = tf.one_hot(labels[:, t], len(sets.output_set), dtype=tf.float32)
+
+        batch_loss = loss / num_predictions
 
-    batch_loss = loss / (len(targets) - 1)
-    
     variables = img_process.trainable_variables + dsbrnn.trainable_variables + speller.trainable_variables
 
-    gradients = tape.gradient(loss, variables)
+    gradients = tape.gradient(batch_loss, variables)
 
     optimizer.apply_gradients(zip(gradients, variables))
 
     speller.reset()
 
-    return batch_loss
\ No newline at end of file
+    return batch_loss
+
+# Returns a compiled version of `train_step` for the given model, taking just (inputs, targets). It
+# does the same thing, but runs as a single graph: the teacher-forcing loop becomes an in-graph
+# loop, and the speller uses its stateless interface so that its state can be carried through it.
+#
+# The function has a fixed input signature with unknown batch and sequence lengths, so it's only
+# traced once. If `jit_compile` is True, it's also compiled with XLA, which is done again for every
+# new input shape -- `make_dataset` can pad batches to keep the number of those down.
+def make_compiled_train_step(img_process, dsbrnn, speller, jit_compile=False):
+    output_size = len(sets.output_set)
+
+    frames_spec = tf.TensorSpec([None, None, consts.output_height, consts.output_width, 3], tf.float32)
+    input_signature = [
+        (frames_spec, frames_spec, tf.TensorSpec([None], tf.int32)),
+        (tf.TensorSpec([None, None], tf.int32), tf.TensorSpec([None], tf.int32)),
+    ]
+
+    @tf.function(input_signature=input_signature, jit_compile=jit_compile)
+    def compiled_train_step(inputs, targets):
+        (left, right, frame_lengths) = inputs
+        (labels, label_lengths) = targets
+
+        loss = tf.constant(0.0)
+
+        # the first label of each sequence is the start character, so it's never predicted
+        num_predictions = tf.cast(tf.reduce_sum(label_lengths - 1), tf.float32)
+
+        with tf.GradientTape() as tape:
+            encoded = dsbrnn([apply_per_frame(img_process, left), apply_per_frame(img_process, right), frame_lengths])
+            encoded = speller.prepare(encoded)
+
+            state = speller.initial_state(tf.shape(labels)[0])
+
+            # teacher forcing, so we'll disregard the previous
+            speller_input = tf.one_hot(labels[:, 0], output_size, dtype=tf.float32)
+            for t in tf.range(1, tf.shape(labels)[1]):
+                predictions, state = speller.step(encoded, speller_input, state)
+
+                # sequences that have already finished are padding at this point
+                loss += loss_function(labels[:, t], predictions, t < label_lengths)
+
+                # teacher forcing
+                speller_input = tf.one_hot(labels[:, t], output_size, dtype=tf.float32)
+
+            batch_loss = loss / num_predictions
+
+        variables = img_process.trainable_variables + dsbrnn.trainable_variables + speller.trainable_variables
+
+        gradients = tape.gradient(batch_loss, variables)
+
+        optimizer.apply_gradients(zip(gradients, variables))
+
+        return batch_loss
+
+    return compiled_train_step
@@ -68,19 +68,43 @@ checkpoint = tf.train.Checkpoint(optimizer=helper.optimizer,
                                  speller=speller)
 
 # train
-dset = helper.index_list()
-
 EPOCHS = 10
+BATCH_SIZE = 32
+# recordings are batched with others of similar lengths. These are the edges of the buckets, in
+# frames (there are 30 frames per second).
+BUCKET_BOUNDARIES = [60, 90, 120, 150, 180, 240, 300]
+# the number of recordings that are loaded in parallel while training
+NUM_PARALLEL_READS = 4
+# whether to run each training step as a compiled graph, and whether to also compile it with XLA
+COMPILE = True
+JIT_COMPILE = False
+
+# XLA compiles again for every new shape, so in that case we pad the batches to keep the number of
+# shapes down
+FRAME_PAD_MULTIPLE = 30 if JIT_COMPILE else 1
+LABEL_PAD_MULTIPLE = 16 if JIT_COMPILE else 1
+
+dset = helper.make_dataset(batch_size=BATCH_SIZE,
+                           bucket_boundaries=BUCKET_BOUNDARIES,
+                           frame_pad_multiple=FRAME_PAD_MULTIPLE,
+                           label_pad_multiple=LABEL_PAD_MULTIPLE,
+                           num_parallel_reads=NUM_PARALLEL_READS)
+
+if COMPILE:
+    train_step = helper.make_compiled_train_step(img_process, dsbrnn, speller, jit_compile=JIT_COMPILE)
+else:
+    def train_step(inputs, targets):
+        return helper.train_step(img_process, dsbrnn, speller, inputs, targets)
+
 for epoch in range(EPOCHS):
     start = time.time()
 
     total_loss = 0
-    for batch, (video_id, n) in enumerate(dset):
-        img_seq = helper.get_images(video_id, n)
-        targets = sets.as_labels(sets.from_id(video_id))
-
-        batch_loss = helper.train_step(img_process, dsbrnn, speller, img_seq, targets)
+    num_batches = 0
+    for batch, (inputs, targets) in enumerate(dset):
+        batch_loss = train_step(inputs, targets)
         total_loss += batch_loss
+        num_batches += 1
 
         if batch % 10 == 0:
             print('Epoch {} Batch {} Loss {:.4f}'.format(epoch + 1, batch, batch_loss.numpy()))
@@ -89,5 +113,5 @@ for epoch in range(EPOCHS):
     if (epoch + 1) % 2 == 0:
         checkpoint.save(file_prefix = consts.checkpoint_prefix)
 
-    print('Epoch {} Loss {:.4f}'.format(epoch + 1, total_loss / len(dset)))
+    print('Epoch {} Loss {:.4f}'.format(epoch + 1, total_loss / num_batches))
     print('Time taken for 1 epoch {} sec\n'.format(time.time() - start))
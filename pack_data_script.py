@@ -0,0 +1,24 @@
+# Converts every recording listed in 'namespace.json' from its directory of JPEGs in 'Data/' into
+# the packed format described in 'packed_data.py'. Once this has been run, 'helper.get_images' will
+# read from the packed file instead of the JPEGs.
+#
+# The packed files are rewritten from scratch every time, so this should be re-run whenever new
+# data is added.
+
+import json
+
+import consts
+import packed_data
+
+entries = []
+with open(consts.namespace_path) as f:
+    namespace = json.load(f)
+    for video_id, n in namespace.items():
+        for i in range(0, n):
+            entries.append((int(video_id), i))
+
+print('Packing {} recordings...'.format(len(entries)))
+index = packed_data.pack(entries)
+
+total_frames = sum(length for _, length in index.values())
+print("Done. Wrote {} frames to '{}'".format(total_frames, consts.packed_data_file))
@@ -0,0 +1,164 @@
+# Reading and writing for the packed version of the dataset.
+#
+# Loading a recording from 'Data/' means decoding two tiny JPEGs for every frame, which ends up
+# dominating the time it takes to get through an epoch. Instead, every recording can be packed into
+# a single contiguous uint8 array with shape (frames, 2, output_height, output_width, 3), where index
+# 0 on the second axis is the left eye and index 1 is the right eye.
+#
+# All of the recordings are concatenated into one file ('consts.packed_data_file'). A separate
+# index file ('consts.packed_index_file') maps each '$ID-$N' entry to a pair of [offset, length],
+# where the offset is in bytes from the start of the data file and the length is in frames.
+#
+# The packed files are built from the JPEGs (or from the per-recording packed files that conversion
+# can write instead) with 'pack_data_script.py'. They can then either be read
+# one recording at a time with `read_recording`, or memory-mapped as a whole with `PackedStore`.
+
+import os
+import json
+from os import path
+
+import numpy as np
+import cv2
+
+import consts
+
+# the shape of a single frame in the packed data: both eyes, stacked
+frame_shape = (2, consts.output_height, consts.output_width, 3)
+frame_size = int(np.prod(frame_shape))
+
+def entry_name(video, n):
+    return "{}-{}".format(video, n)
+
+def load_index(index_file=consts.packed_index_file):
+    with open(index_file) as f:
+        return json.load(f)
+
+# returns the frames of the recording as a uint8 array with shape (frames,) + frame_shape, read
+# from the JPEGs in its subdirectory of 'Data/'
+def read_jpeg_recording(video, n):
+    subdir = path.join(consts.data_dir, entry_name(video, n))
+
+    total = path.join(subdir, consts.num_total_file)
+    if not path.exists(total):
+        raise Exception("No total file found ('{}' does not exist)".format(total))
+    with open(total) as f:
+        size = int(f.read().strip())
+
+    frames = np.empty((size,) + frame_shape, dtype=np.uint8)
+
+    for i in range(0, size):
+        for eye, eye_format in enumerate([consts.left_eye_format, consts.right_eye_format]):
+            img_path = path.join(subdir, eye_format.format(i))
+
+            img = cv2.imread(img_path)
+            if img is None:
+                raise Exception("File '{}' not found.".format(img_path))
+
+            # cropping doesn't always produce exactly the output size (there's some rounding
+            # involved), so we'll make sure that it fits here.
+            if img.shape != frame_shape[1:]:
+                img = cv2.resize(img, (consts.output_width, consts.output_height))
+
+            frames[i, eye] = img
+
+    return frames
+
+# returns the frames of the recording in the same format as `read_jpeg_recording`, from its
+# subdirectory of 'Data/'. Conversion can write the eyes directly into a single raw file in the
+# subdirectory (see `consts.write_packed_eyes`), which is used if it's there -- otherwise the
+# frames are read from the JPEGs.
+def read_converted_recording(video, n):
+    packed_eyes = path.join(consts.data_dir, entry_name(video, n), consts.packed_eyes_file)
+    if not path.exists(packed_eyes):
+        return read_jpeg_recording(video, n)
+
+    return np.fromfile(packed_eyes, dtype=np.uint8).reshape((-1,) + frame_shape)
+
+# writes every recording given by `entries` -- an iterable of (video, n) -- to the packed data file,
+# along with its index. Returns the index.
+def pack(entries, data_file=consts.packed_data_file, index_file=consts.packed_index_file):
+    index = {}
+    offset = 0
+
+    # Both files are written next to the old ones first, so that the old files stay usable if we're
+    # interrupted. They're then moved into place: the old index is removed before the data is
+    # replaced, and the new index goes in last, so there's never an index pointing at data that
+    # isn't there (or at the wrong data).
+    tmp_data_file = data_file + '.tmp'
+    tmp_index_file = index_file + '.tmp'
+
+    with open(tmp_data_file, 'wb') as f:
+        for video, n in entries:
+            frames = read_converted_recording(video, n)
+            f.write(frames.tobytes())
+
+            index[entry_name(video, n)] = [offset, len(frames)]
+            offset += frames.nbytes
+
+    with open(tmp_index_file, 'w') as f:
+        json.dump(index, f)
+
+    if path.exists(index_file):
+        os.remove(index_file)
+    os.replace(tmp_data_file, data_file)
+    os.replace(tmp_index_file, index_file)
+
+    return index
+
+# returns the frames of the recording as a uint8 array with shape (frames,) + frame_shape, using a
+# single read from the packed data file
+def read_recording(index, video, n, data_file=consts.packed_data_file):
+    name = entry_name(video, n)
+    if name not in index:
+        raise Exception("Entry '{}' not found in packed index".format(name))
+
+    offset, length = index[name]
+
+    with open(data_file, 'rb') as f:
+        f.seek(offset)
+        buf = f.read(length * frame_size)
+
+    if len(buf) != length * frame_size:
+        raise Exception("Packed data for '{}' is truncated".format(name))
+
+    return np.frombuffer(buf, dtype=np.uint8).reshape((length,) + frame_shape)
+
+# A memory-mapped view of the entire packed data file. Indexing with (video, n) gives a NumPy view
+# of that recording's frames -- nothing is copied, and nothing is read from disk until the view is
+# used. Because the pages are backed by the file itself, the OS page cache is shared by every
+# process that has the store open, so memory usage stays flat no matter how large the dataset is.
+#
+# The file is only mapped on first access, so a store can be created before forking worker
+# processes.
+class PackedStore():
+    def __init__(self, data_file=consts.packed_data_file, index_file=consts.packed_index_file):
+        self.data_file = data_file
+        self.index = load_index(index_file)
+
+        self.data = None
+
+    def keys(self):
+        keys = []
+        for name in self.index:
+            video, n = name.split('-')
+            keys.append((int(video), int(n)))
+
+        return keys
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return entry_name(*key) in self.index
+
+    # returns a read-only view with shape (frames,) + frame_shape
+    def __getitem__(self, key):
+        name = entry_name(*key)
+        if name not in self.index:
+            raise Exception("Entry '{}' not found in packed index".format(name))
+
+        if self.data is None:
+            self.data = np.memmap(self.data_file, dtype=np.uint8, mode='r')
+
+        offset, length = self.index[name]
+        return self.data[offset:offset + length * frame_size].reshape((length,) + frame_shape)
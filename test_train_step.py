@@ -0,0 +1,71 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from Model.model import *
+import helper
+import consts
+
+print('Testing the compiled train step')
+
+# a small version of the model in 'main_script.py'
+input_shape = [consts.output_height, consts.output_width, 3]
+img_process = keras.Sequential([
+    layers.Conv2D(15, (7, 7), activation='relu', input_shape=input_shape),
+    layers.Conv2D(15, (3, 3), strides=(2, 2), activation='relu'),
+])
+
+dsbrnn = DeepStackedBiRNNBuilder(img_process.layers[-1].output_shape[1:])
+dsbrnn.add(20, output_pooling=2)
+dsbrnn.add(20)
+dsbrnn = dsbrnn.build()
+
+speller = Speller(10, 4, (0, 4), 20, consts.final_output_size)
+helper.trial_with_random(img_process, dsbrnn, speller)
+
+# a padded batch of two recordings, like the ones from `helper.make_dataset` with
+# `frame_pad_multiple=30` and `label_pad_multiple=16`: the second recording and both sentences are
+# shorter than their padding
+frame_lengths = tf.constant([60, 45])
+left = tf.random.uniform([2, 60] + input_shape, maxval=255)
+right = tf.random.uniform([2, 60] + input_shape, maxval=255)
+left = left * tf.sequence_mask(frame_lengths, 60, dtype=tf.float32)[:, :, tf.newaxis, tf.newaxis, tf.newaxis]
+right = right * tf.sequence_mask(frame_lengths, 60, dtype=tf.float32)[:, :, tf.newaxis, tf.newaxis, tf.newaxis]
+
+label_lengths = tf.constant([12, 7])
+labels = np.random.randint(0, consts.final_output_size, size=[2, 16]).astype(np.int32)
+labels[:, 0] = 0
+for i, length in enumerate(label_lengths.numpy()):
+    labels[i, length:] = 0
+labels = tf.constant(labels)
+
+inputs = (left, right, frame_lengths)
+targets = (labels, label_lengths)
+
+# every version of the step is run from the same weights, so they should all give the same loss
+models = [img_process, dsbrnn, speller]
+weights = [m.get_weights() for m in models]
+def restore():
+    for m, w in zip(models, weights):
+        m.set_weights(w)
+
+losses = {}
+
+losses['eager'] = float(helper.train_step(img_process, dsbrnn, speller, inputs, targets))
+
+restore()
+step = helper.make_compiled_train_step(img_process, dsbrnn, speller)
+losses['compiled'] = float(step(inputs, targets))
+
+restore()
+step = helper.make_compiled_train_step(img_process, dsbrnn, speller, jit_compile=True)
+losses['xla'] = float(step(inputs, targets))
+
+print('losses:', losses)
+
+for name, loss in losses.items():
+    if not np.isclose(loss, losses['eager'], rtol=1e-4):
+        raise Exception("Loss for the '{}' step doesn't match the eager step".format(name))
+
+print('done testing!')